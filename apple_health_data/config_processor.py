@@ -7,9 +7,11 @@ import zipfile
 import pandas as pd
 from dateutil.parser import parse as date_parser
 from dateutil.relativedelta import relativedelta
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
-from typing import Dict, Optional, Union, Any, List
-from pydantic import TypeAdapter
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple, Union
+from pydantic import BaseModel, TypeAdapter
+from inflection import underscore, dasherize
 
 from apple_health_data.file_operations import (
     remove_filename_extensions,
@@ -17,20 +19,33 @@ from apple_health_data.file_operations import (
     get_last_modified_date,
     copy_file,
     move_file,
-    rename_files,
     write_json,
     read_json,
+    write_artifact,
+    read_model_data,
 )
 
-from apple_health_data.utils import dict_to_string, save_dataframe
+from apple_health_data.utils import DataFrameModel, dict_to_string, save_dataframe
 
 from apple_health_data.core.logger import (
     ExtraInfoFormatter,
     VerbosityLogger,
     VerbosityLoggerConfig,
 )
-from apple_health_data.core.parser import HealthDataExtractor
-from apple_health_data.core.summarizer import DataWrangler, TypeSummary
+from apple_health_data.core.cache import SummaryCache
+from apple_health_data.core.ecg import extract_ecgs
+from apple_health_data.core.parser import HealthDataExtractor, abbreviate
+from apple_health_data.core.routes import extract_routes
+from apple_health_data.core.summarizer import (
+    DataWrangler,
+    TypeSummary,
+    summarize_sweep,
+)
+
+
+WATERMARKS_FILENAME = "watermarks.json"
+ROUTES_FILENAME = "workout-route-points.parquet"
+ECG_FOLDERNAME = "electrocardiograms"
 
 
 def process_biodata(
@@ -198,115 +213,391 @@ def extract_export_xml(
     return xml_file_path
 
 
+def parsed_file_stem(kind: str) -> str:
+    "Parsed file stem of a record type, e.g. HKQuantityTypeIdentifierStepCount -> step-count"
+    return dasherize(underscore(abbreviate(kind)))
+
+
+def get_parameter_types(parameters: List[Dict[str, Any]]) -> List[str]:
+    """
+    Record types needed by the parameters in config.json, as the stems of
+    their parsed files (e.g. active-energy-burned), without duplicates.
+    """
+    types = []
+    for param in parameters:
+        parsed_file = Path(param["data_wrangler"]["file_path"]).name
+        param_type = remove_filename_extensions(parsed_file, remove_all=True)
+        if param_type not in types:
+            types.append(param_type)
+
+    return types
+
+
 def parse_export_xml_parameters(
-    export_xml: str, target_directory: str, vlogger: VerbosityLogger = VerbosityLogger()
+    export_xml: Union[str, Path],
+    target_directory: str,
+    vlogger: VerbosityLogger = VerbosityLogger(),
+    streaming: bool = True,
+    types: Optional[Iterable[str]] = None,
+    workers: int = 1,
+    output_format: str = "csv",
+    incremental: bool = False,
+    nested: bool = False,
 ) -> None:
-    vlogger.info("[START] Parse parameters in XML to CSV", 0)
-    data = HealthDataExtractor(
-        path=export_xml, target_directory=target_directory, vlogger=vlogger
+    """
+    Parse export.xml into one CSV per record type. export_xml may also be
+    the export.zip itself, which is decompressed while it is parsed so no
+    intermediate export.xml is written. If types is given (see
+    get_parameter_types), only those types are extracted. With more than
+    one worker export.xml is parsed in parallel byte ranges; from an
+    export.zip it is first extracted to a temporary export.xml in
+    target_directory, since a compressed member cannot be split. Set
+    output_format to "parquet" to write typed columnar files instead.
+
+    The latest creationDate written for each type is saved to
+    watermarks.json in target_directory. With incremental set, only
+    records newer than those watermarks are parsed and they are appended
+    to the existing files, so re-ingesting a cumulative export costs time
+    in proportion to the new data. Types whose file in output_format is
+    missing are extracted in full. The watermarks are only saved after the
+    whole extract: a run that fails part way may have appended to some
+    files already, so the folder must be parsed again from scratch.
+
+    With nested set, MetadataEntry and heartbeat child elements are also
+    extracted into Parquet tables keyed by recordId (see
+    HealthDataExtractor); this cannot be combined with incremental.
+    """
+    vlogger.info(f"[START] Parse parameters in XML to {output_format.upper()}", 0)
+    if types is not None:
+        vlogger.info(f"Extracting types: {', '.join(types)}", 1)
+
+    Path(target_directory).mkdir(parents=True, exist_ok=True)
+    watermarks_file = Path(target_directory) / WATERMARKS_FILENAME
+    watermarks = {}
+    if incremental:
+        if watermarks_file.exists():
+            watermarks = read_json(file_path=watermarks_file, vlogger=vlogger)
+            vlogger.info(f"Extracting records newer than {watermarks_file}", 1)
+        else:
+            vlogger.warning(
+                f"No watermarks found in {target_directory}, extracting all records",
+                0,
+            )
+
+    extracted_xml = None
+    if workers > 1 and not nested and zipfile.is_zipfile(export_xml):
+        vlogger.info(f"Extracting export.xml from {export_xml} to parse in parallel", 1)
+        extracted_xml = extract_export_xml(
+            Path(export_xml), Path(target_directory), vlogger=vlogger
+        )
+        if extracted_xml is None:
+            raise FileNotFoundError(f"No export.xml found in {export_xml}")
+        export_xml = extracted_xml
+
+    try:
+        data = HealthDataExtractor(
+            path=export_xml,
+            target_directory=target_directory,
+            vlogger=vlogger,
+            streaming=streaming,
+            types=types,
+            workers=workers,
+            output_format=output_format,
+            watermarks=watermarks,
+            append=incremental,
+            naming=parsed_file_stem,
+            nested=nested,
+        )
+        data.extract()
+        data.report_stats()
+    finally:
+        if extracted_xml is not None:
+            os.remove(extracted_xml)
+
+    write_json(data=data.watermarks, file_path=watermarks_file, vlogger=vlogger)
+    vlogger.info(f"[END] Parse parameters in XML to {output_format.upper()}", 0)
+
+
+def parse_workout_routes(
+    export_zip: Union[str, Path],
+    target_directory: Union[str, Path],
+    vlogger: VerbosityLogger = VerbosityLogger(),
+    workers: Optional[int] = None,
+) -> Path:
+    """
+    Parse the workout-routes/*.gpx files of export.zip, in a pool of
+    worker processes, into one trackpoint per row of
+    workout-route-points.parquet in target_directory. Routes are linked to
+    their Workouts through the route column, which matches the path of
+    the WorkoutRoute nested table (see parse_export_xml_parameters).
+    """
+    vlogger.info("[START] Parse workout routes", 0)
+
+    routes_file = Path(target_directory) / ROUTES_FILENAME
+    stats = extract_routes(
+        export_zip=export_zip, target_file=routes_file, workers=workers, vlogger=vlogger
     )
-    data.report_stats()
-    data.extract()
-    vlogger.info("[END] Parse parameters in XML to CSV", 0)
+    if stats["routes"] or stats["failed"]:
+        vlogger.info(
+            f"Parsed {stats['routes']} routes ({stats['points']} points) "
+            f"to {routes_file}, {stats['failed']} failed",
+            1,
+        )
+    else:
+        vlogger.info(f"No workout routes found in {export_zip}", 1)
+
+    vlogger.info("[END] Parse workout routes", 0)
+
+    return routes_file
+
 
-    vlogger.info("Renaming CSV files in parsed folder", 0)
-    rename_files(
-        source_directory=target_directory, target_extension=".csv", vlogger=vlogger
+def parse_electrocardiograms(
+    export_zip: Union[str, Path],
+    target_directory: Union[str, Path],
+    vlogger: VerbosityLogger = VerbosityLogger(),
+    workers: Optional[int] = None,
+) -> Path:
+    """
+    Parse the electrocardiograms/*.csv files of export.zip, in a pool of
+    worker processes, into the ECG store in the electrocardiograms folder
+    of target_directory: float32 samples that can be memory-mapped, and
+    an index by recording date (see apple_health_data.core.ecg.load_ecg).
+    """
+    vlogger.info("[START] Parse electrocardiograms", 0)
+
+    store_directory = Path(target_directory) / ECG_FOLDERNAME
+    stats = extract_ecgs(
+        export_zip=export_zip,
+        store_directory=store_directory,
+        workers=workers,
+        vlogger=vlogger,
+    )
+    if stats["recordings"] or stats["failed"]:
+        vlogger.info(
+            f"Parsed {stats['recordings']} ECGs ({stats['samples']} samples) "
+            f"to {store_directory}, {stats['failed']} failed",
+            1,
+        )
+    else:
+        vlogger.info(f"No electrocardiograms found in {export_zip}", 1)
+
+    vlogger.info("[END] Parse electrocardiograms", 0)
+
+    return store_directory
+
+
+def map_jobs(function: Callable, jobs: int, *iterables: Iterable) -> List[Any]:
+    """
+    Results of function mapped over iterables, in order, computed in a pool
+    of jobs processes if jobs is more than 1 and in this process otherwise.
+    An exception raised by function is raised again here.
+    """
+    if jobs > 1:
+        with ProcessPoolExecutor(max_workers=jobs) as executor:
+            return list(executor.map(function, *iterables))
+    return list(map(function, *iterables))
+
+
+def compression_threads(jobs: int) -> int:
+    "zstd threads for workers of a pool of jobs: one per CPU unless in a pool"
+    return -1 if jobs <= 1 else 0
+
+
+def write_model(
+    model: BaseModel,
+    file_path: Path,
+    artifact_format: str = "json",
+    compression_codec: Union[str, None] = None,
+    vlogger: VerbosityLogger = VerbosityLogger(),
+    compression_level: Optional[int] = None,
+    compression_threads: int = 0,
+    **dump_kwargs: Any,
+) -> Path:
+    """
+    Write the dump of model to JSON, or as Parquet frames and a JSON
+    metadata file (see write_artifact) if artifact_format is parquet, or
+    memory-mappable series stores and a JSON metadata file if it is series.
+    compression_threads only applies to zstd-compressed JSON.
+    """
+    if artifact_format in ("parquet", "series"):
+        return write_artifact(
+            model=model,
+            file_path=file_path,
+            compression_codec=compression_codec,
+            vlogger=vlogger,
+            compression_level=compression_level,
+            frame_format=artifact_format,
+            **dump_kwargs,
+        )
+    if artifact_format == "json":
+        return write_json(
+            data=model.model_dump(**dump_kwargs),
+            file_path=file_path,
+            compression_codec=compression_codec,
+            vlogger=vlogger,
+            compression_level=compression_level,
+            compression_threads=compression_threads,
+        )
+    raise ValueError(f"Invalid artifact format {artifact_format}")
+
+
+def wrangle_parsed_file(
+    kwargs: Dict[str, Any],
+    wrangled_folder: Path,
+    compression_codec: Union[str, None],
+    vlogger_config: VerbosityLoggerConfig,
+    artifact_format: str = "json",
+    compression_level: Optional[int] = None,
+    compression_threads: int = 0,
+) -> Tuple[str, str]:
+    "Worker for wrangle_parsed_data: wrangle a parsed file to artifact_format"
+    vlogger = vlogger_config.vlogger
+    parsed_file = kwargs["file_path"]
+    param_name = remove_filename_extensions(parsed_file.name)
+
+    materialized = DataFrameModel.materialized
+    vlogger.info(f"[START] Wrangling parsed data from {parsed_file}", 0)
+    wrangled_data = DataWrangler(**kwargs, vlogger_config=vlogger_config)
+    vlogger.info(f"[END] Wrangling parsed data from {parsed_file}", 0)
+
+    wrangled_file = write_model(
+        model=wrangled_data,
+        file_path=wrangled_folder / param_name,
+        artifact_format=artifact_format,
+        compression_codec=compression_codec,
+        vlogger=vlogger,
+        compression_level=compression_level,
+        compression_threads=compression_threads,
+        exclude={"vlogger_config"},
+    )
+    vlogger.info(
+        f"Materialized {DataFrameModel.materialized - materialized} frames "
+        f"while wrangling {parsed_file}",
+        1,
     )
 
+    return str(parsed_file), str(wrangled_file)
+
 
 def wrangle_parsed_data(
     wrangler_kwargs: List[Dict[str, Any]],
     wrangled_folder: Path,
     compression_codec: Union[str, None] = None,
     vlogger: VerbosityLogger = VerbosityLogger(),
+    jobs: int = 1,
+    artifact_format: str = "json",
+    compression_level: Optional[int] = None,
 ) -> Dict[Path, Path]:
+    """
+    Wrangle each parsed file to artifact_format (json, parquet or series,
+    see write_model) in wrangled_folder, in a pool of jobs processes. A file
+    listed more than once is wrangled once, with its last kwargs (it would
+    be written to the same file anyway). zstd compresses with a thread per
+    CPU when jobs is 1, single threaded in a pool.
+    """
     vlogger_config = VerbosityLoggerConfig(
         name=vlogger.logger_name, verbosity=vlogger.verbosity
     )
 
     vlogger.info(f"[START] Wrangle parsed data", 0)
 
-    wrangled_filemap = {}
+    unique_kwargs = {}
     for kwargs in wrangler_kwargs:
-        parsed_file = kwargs["file_path"]
-        param_name = remove_filename_extensions(parsed_file.name)
-
-        vlogger.info(f"[START] Wrangling parsed data from {parsed_file}", 0)
-        wrangled_data = DataWrangler(**kwargs, vlogger_config=vlogger_config)
-        vlogger.info(f"[END] Wrangling parsed data from {parsed_file}", 0)
-
-        wrangled_file = write_json(
-            data=wrangled_data.model_dump(exclude={"vlogger_config"}),
-            file_path=wrangled_folder / param_name,
-            compression_codec=compression_codec,
-            vlogger=vlogger,
-        )
-
-        wrangled_filemap.update({str(parsed_file): str(wrangled_file)})
+        parsed_file = str(kwargs["file_path"])
+        if parsed_file in unique_kwargs:
+            vlogger.info(f"Wrangling {parsed_file} once, it is listed again", 1)
+        unique_kwargs[parsed_file] = kwargs
+
+    n_files = len(unique_kwargs)
+    results = map_jobs(
+        wrangle_parsed_file,
+        jobs,
+        unique_kwargs.values(),
+        [wrangled_folder] * n_files,
+        [compression_codec] * n_files,
+        [vlogger_config] * n_files,
+        [artifact_format] * n_files,
+        [compression_level] * n_files,
+        [compression_threads(jobs)] * n_files,
+    )
+    wrangled_filemap = dict(results)
 
     vlogger.info(f"[END] Wrangle parsed data", 0)
 
     return wrangled_filemap
 
 
-def summarize_parameters(
-    wrangled_filemap: Dict[str, str],
-    parameters: Dict[str, Dict[str, Any]],
+def summarize_wrangled_file(
+    wrangled_file: Path,
+    parameters: List[Dict[str, Any]],
     summarized_folder: Path,
-    compression_codec: Union[str, None] = None,
-    vlogger: VerbosityLogger = VerbosityLogger(),
-) -> Dict[str, TypeSummary]:
-    wrangled_filemap = {
-        str(Path(k).name): str(v) for k, v in wrangled_filemap.copy().items()
-    }
+    compression_codec: Union[str, None],
+    vlogger_config: VerbosityLoggerConfig,
+    summary_cache: Optional[SummaryCache] = None,
+    artifact_format: str = "json",
+    compression_level: Optional[int] = None,
+    compression_threads: int = 0,
+) -> Tuple[Dict[Union[str, Path], Any], Dict[str, int]]:
+    """
+    Worker for summarize_parameters: summarize the parameters of one
+    wrangled file, which is read once for all of them. An error in a
+    parameter is logged and the other parameters are still summarized.
+    Summaries are dumped with their computed summary and sources (which a
+    round_trip dump leaves out), since collate_summaries reads them back in
+    another process. Also returns the hits, misses and evictions of summary_cache and the
+    number of frames that were materialized (see DataFrameModel).
+    """
+    vlogger = vlogger_config.vlogger
+    cache_stats = summary_cache.stats if summary_cache is not None else {}
+    materialized = DataFrameModel.materialized
 
-    vlogger_config = VerbosityLoggerConfig(
-        name=vlogger.logger_name, verbosity=vlogger.verbosity
-    )
+    vlogger.info(f"Reading wrangled data from {wrangled_file}", 0)
+    wrangled_data = read_model_data(file_path=wrangled_file)
+    wrangled_obj = TypeAdapter(DataWrangler).validate_python(wrangled_data)
+
+    param_type = wrangled_data["type"]
+    param_name = remove_filename_extensions(wrangled_file.name, remove_all=True)
 
     type_summaries = {}
     for param in parameters:
-        parsed_csv = Path(param["data_wrangler"]["file_path"]).name
-        wrangled_file = Path(wrangled_filemap[parsed_csv])
-
-        vlogger.info(f"Reading wrangled data from {wrangled_file}", 0)
-        wrangled_data = read_json(file_path=wrangled_file)
-        wrangled_obj = TypeAdapter(DataWrangler).validate_python(wrangled_data)
-
-        param_type = wrangled_data["type"]
-        param_name = remove_filename_extensions(wrangled_file.name, remove_all=True)
-
         try:
             vlogger.info(f"[START] Summarize parameter: {param_type}", 0)
 
             obj = param["type_summary"]
             if "sweep" in param and param["sweep"] is not None:
-                summarized_files = []
-
+                summaries = []
                 for sweep_vals in param["sweep"]:
                     merged_obj = obj.copy()
                     merged_obj.update(sweep_vals)
 
-                    summary = TypeSummary(
-                        wrangled_data=wrangled_obj,
-                        vlogger_config=vlogger_config,
-                        **merged_obj,
+                    summaries.append(
+                        TypeSummary(
+                            wrangled_data=wrangled_obj,
+                            vlogger_config=vlogger_config,
+                            summary_cache=summary_cache,
+                            **merged_obj,
+                        )
                     )
 
+                summarize_sweep(summaries)
+
+                summarized_files = []
+                for sweep_vals, summary in zip(param["sweep"], summaries):
                     settings_str = dict_to_string(
                         dictionary=sweep_vals, separator="-"
                     ).lower()
 
-                    summarized_json = write_json(
-                        data=summary.model_dump(
-                            round_trip=True, exclude={"wrangled_data", "vlogger_config"}
-                        ),
+                    summarized_json = write_model(
+                        model=summary,
                         file_path=(
                             summarized_folder / f"{param_name}-{settings_str}.json"
                         ),
+                        artifact_format=artifact_format,
                         compression_codec=compression_codec,
                         vlogger=vlogger,
+                        compression_level=compression_level,
+                        compression_threads=compression_threads,
+                        exclude={"wrangled_data", "vlogger_config"},
                     )
 
                     summarized_files.append(str(summarized_json))
@@ -314,25 +605,107 @@ def summarize_parameters(
                 type_summaries[str(wrangled_file)] = summarized_files
             else:
                 summary = TypeSummary(
-                    wrangled_data=wrangled_obj, vlogger_config=vlogger_config, **obj
+                    wrangled_data=wrangled_obj,
+                    vlogger_config=vlogger_config,
+                    summary_cache=summary_cache,
+                    **obj,
                 )
 
-                summarized_json = write_json(
-                    data=summary.model_dump(
-                        round_trip=True, exclude={"wrangled_data", "vlogger_config"}
-                    ),
+                summarized_json = write_model(
+                    model=summary,
                     file_path=summarized_folder / f"{param_name}.json",
+                    artifact_format=artifact_format,
                     compression_codec=compression_codec,
                     vlogger=vlogger,
+                    compression_level=compression_level,
+                    compression_threads=compression_threads,
+                    exclude={"wrangled_data", "vlogger_config"},
                 )
 
-                type_summaries[wrangled_file] = summarized_json
+                type_summaries[str(wrangled_file)] = [str(summarized_json)]
 
             vlogger.info(f"[END] Summarize parameter: {param_type}", 0)
 
         except Exception as e:
             vlogger.error(f"Error summarizing data for parameter {param_type}: {e}", 0)
 
+    if summary_cache is not None:
+        cache_stats = {
+            name: count - cache_stats[name] for name, count in summary_cache.stats.items()
+        }
+    cache_stats["frames"] = DataFrameModel.materialized - materialized
+    return type_summaries, cache_stats
+
+
+def summarize_parameters(
+    wrangled_filemap: Dict[str, str],
+    parameters: Dict[str, Dict[str, Any]],
+    summarized_folder: Path,
+    compression_codec: Union[str, None] = None,
+    vlogger: VerbosityLogger = VerbosityLogger(),
+    jobs: int = 1,
+    summary_cache: Optional[SummaryCache] = None,
+    artifact_format: str = "json",
+    compression_level: Optional[int] = None,
+) -> Dict[str, TypeSummary]:
+    """
+    Summarize each parameter from its wrangled file into summarized_folder,
+    in a pool of jobs processes, one wrangled file per task. Parameters
+    listed more than once are summarized once. Summaries found in
+    summary_cache are not computed again, and new ones are added to it.
+    Summaries are written in artifact_format, see write_model, and
+    compressed like in wrangle_parsed_data.
+    """
+    wrangled_filemap = {
+        str(Path(k).name): str(v) for k, v in wrangled_filemap.copy().items()
+    }
+
+    vlogger_config = VerbosityLoggerConfig(
+        name=vlogger.logger_name, verbosity=vlogger.verbosity
+    )
+
+    wrangled_parameters = {}
+    for param in parameters:
+        parsed_csv = Path(param["data_wrangler"]["file_path"]).name
+        wrangled_file = Path(wrangled_filemap[parsed_csv])
+        file_parameters = wrangled_parameters.setdefault(wrangled_file, [])
+        if param in file_parameters:
+            vlogger.info(f"Summarizing {parsed_csv} once, it is listed again", 1)
+            continue
+        file_parameters.append(param)
+
+    n_files = len(wrangled_parameters)
+    results = map_jobs(
+        summarize_wrangled_file,
+        jobs,
+        wrangled_parameters.keys(),
+        wrangled_parameters.values(),
+        [summarized_folder] * n_files,
+        [compression_codec] * n_files,
+        [vlogger_config] * n_files,
+        [summary_cache] * n_files,
+        [artifact_format] * n_files,
+        [compression_level] * n_files,
+        [compression_threads(jobs)] * n_files,
+    )
+
+    type_summaries = {}
+    cache_stats = {}
+    for file_summaries, file_cache_stats in results:
+        type_summaries.update(file_summaries)
+        for name, count in file_cache_stats.items():
+            cache_stats[name] = cache_stats.get(name, 0) + count
+
+    if summary_cache is not None:
+        vlogger.info(
+            f"Summary cache {summary_cache.directory}: {cache_stats['hits']} hits, "
+            f"{cache_stats['misses']} misses, {cache_stats['evictions']} evictions",
+            0,
+        )
+    vlogger.info(
+        f"Materialized {cache_stats.get('frames', 0)} frames while summarizing", 1
+    )
+
     return type_summaries
 
 
@@ -355,7 +728,7 @@ def collate_summaries(
             ts_adapater = TypeAdapter(TypeSummary)
 
             vlogger.info(f"Reading summarized data from {file}", 0)
-            ts_data = read_json(file_path=Path(file))
+            ts_data = read_model_data(file_path=Path(file))
             ts_data["vlogger_config"] = vlogger_config
             ts_obj = ts_adapater.validate_python(ts_data)
 
@@ -0,0 +1,515 @@
+"""
+Vectorized time-bucket aggregation for TypeSummary.summarize.
+
+summarize resamples the values of each source into intervals, aggregates
+each interval with agg_sources, then combines the sources of every
+interval with the summary measures. Done with pandas, that is a groupby
+of resamples whose aggregation is dispatched group by group. Here the
+same result is computed with integer arithmetic on epoch nanoseconds:
+every row gets a bin id, bins are laid out one source after the other,
+and each aggregation is a single numpy reduction over sorted segments
+(np.bincount, ufunc.reduceat).
+
+The bins replicate pandas' resample:
+    fixed intervals (e.g. 6H, 1D, 15T) are closed and labelled on the
+    left and start at midnight of the first day of each source;
+    1W, 1M and 1Y are calendar periods labelled by the midnight of their
+    last day (Sunday, month end, 31 December);
+and, like pandas, every source covers all the bins from its first to its
+last value. Dates are binned in their local (wall-clock) time.
+
+Intervals, timezones or measures that are not covered return None from
+summarize_time_bins, so callers can fall back to pandas.
+"""
+import datetime
+
+import numpy as np
+import pandas as pd
+
+from pandas.tseries.frequencies import to_offset
+from pandas.tseries.offsets import MonthEnd, Tick, Week, YearEnd
+
+from typing import Callable, Dict, List, Optional, Tuple
+from apple_health_data.utils import civil_from_days, days_from_civil
+
+
+MEASURES = ("sum", "mean", "min", "max", "count", "std", "median")
+
+NS_PER_DAY = 86400 * 1_000_000_000
+SUNDAY = 3  # 1970-01-04, the first Sunday, is day 3 of the epoch
+
+
+def local_nanoseconds(dates: pd.Series) -> Optional[np.ndarray]:
+    """
+    Wall-clock time of datetimes as int64 nanoseconds, or None if they
+    cannot be binned here: missing dates, units other than ns, and
+    timezones whose offset changes (resample bins those on local time
+    across DST transitions).
+    """
+    if not pd.api.types.is_datetime64_any_dtype(dates) or dates.isna().any():
+        return None
+    dtype = dates.dtype
+    if getattr(dtype, "unit", "ns") != "ns":
+        return None
+    epoch = pd.DatetimeIndex(dates).asi8
+    tz = getattr(dtype, "tz", None)
+    if tz is None:
+        return epoch
+    offset = fixed_offset(tz)
+    if offset is None:
+        return None
+    return epoch + offset
+
+
+def fixed_offset(tz: datetime.tzinfo) -> Optional[int]:
+    "UTC offset of a timezone in nanoseconds, or None if it is not constant"
+    try:
+        offset = tz.utcoffset(None)
+        # e.g. the system timezone gives its standard offset for None
+        seasonal = {tz.utcoffset(datetime.datetime(2000, m, 1)) for m in (1, 7)}
+    except (TypeError, ValueError):
+        return None
+    if offset is None or seasonal != {offset}:
+        return None
+    return int(offset.total_seconds()) * 1_000_000_000
+
+
+def civil_from_local_days(
+    local: np.ndarray,
+) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    civil_from_days of the day of each local time. Health data spans few
+    days compared to its number of rows, so dates are computed once per
+    day in the span and looked up.
+    """
+    days = local // NS_PER_DAY
+    first, last = days.min(), days.max()
+    if last - first >= len(days):
+        return civil_from_days(days)
+    return tuple(
+        table[days - first] for table in civil_from_days(np.arange(first, last + 1))
+    )
+
+
+def calendar_bins(
+    interval: str,
+) -> Optional[
+    Tuple[Callable[[np.ndarray, np.ndarray], np.ndarray], Callable[[np.ndarray, np.ndarray], np.ndarray]]
+]:
+    """
+    Functions for an interval: bin_ids(local_ns, origins) giving the bin
+    id of each time, and labels(ids, origins) giving the label (local ns)
+    of each bin id. origins is the midnight before the first time of each
+    row's source, which only fixed intervals depend on. None if the
+    interval is not supported.
+    """
+    try:
+        offset = to_offset(interval)
+    except ValueError:
+        return None
+
+    if isinstance(offset, Tick):
+        step = offset.nanos
+        return (
+            lambda local, origins: (local - origins) // step,
+            lambda ids, origins: origins + ids * step,
+        )
+
+    if offset.n != 1:
+        return None
+
+    if isinstance(offset, Week) and offset.weekday == 6:
+        # Sunday on or after each day
+        return (
+            lambda local, origins: (local // NS_PER_DAY - SUNDAY + 6) // 7,
+            lambda ids, origins: (ids * 7 + SUNDAY) * NS_PER_DAY,
+        )
+
+    if isinstance(offset, MonthEnd):
+
+        def month_ids(local, origins):
+            year, month, _ = civil_from_local_days(local)
+            return year * 12 + month - 1
+
+        def month_ends(ids, origins):
+            year, month = np.divmod(ids + 1, 12)
+            return (days_from_civil(year, month + 1, 1) - 1) * NS_PER_DAY
+
+        return month_ids, month_ends
+
+    if isinstance(offset, YearEnd) and offset.month == 12:
+        return (
+            lambda local, origins: civil_from_local_days(local)[0],
+            lambda ids, origins: (days_from_civil(ids + 1, 1, 1) - 1) * NS_PER_DAY,
+        )
+
+    return None
+
+
+def segment_sums(
+    segments: np.ndarray, values: np.ndarray, n_segments: int
+) -> np.ndarray:
+    "Float sum of the values of each segment (np.bincount is int64 when empty)"
+    sums = np.bincount(segments, weights=values, minlength=n_segments)
+    return sums.astype(np.float64, copy=False)
+
+
+def reduce_segments(
+    segments: np.ndarray, values: np.ndarray, n_segments: int, measures: List[str]
+) -> Dict[str, np.ndarray]:
+    """
+    Apply measures to the values of each segment 0..n_segments-1, skipping
+    NaN like pandas: count and sum of an empty segment are 0, the other
+    measures NaN, and std has one degree of freedom. Integer values (the
+    counts of each source, whose dates are never empty) keep their dtype
+    for sum, min and max.
+    """
+    integer = values.dtype.kind in "iu"
+    if not integer:
+        present = ~np.isnan(values)
+        segments, values = segments[present], values[present]
+    if len(segments) > 1 and (np.diff(segments) < 0).any():
+        order = np.argsort(segments, kind="stable")
+        segments, values = segments[order], values[order]
+
+    counts = np.bincount(segments, minlength=n_segments)
+    filled = counts > 0
+    starts = np.concatenate(([0], np.cumsum(counts)[:-1]))[filled]
+
+    results = {}
+    for measure in measures:
+        if measure in results:
+            continue
+        if measure == "count":
+            results[measure] = counts.astype(np.int64)
+        elif measure == "sum":
+            if integer:
+                sums = np.zeros(n_segments, dtype=np.int64)
+                if len(values):
+                    sums[filled] = np.add.reduceat(values, starts)
+                results[measure] = sums
+            else:
+                results[measure] = segment_sums(segments, values, n_segments)
+        elif measure in ("mean", "std"):
+            with np.errstate(invalid="ignore", divide="ignore"):
+                sums = segment_sums(segments, values, n_segments)
+                means = sums / counts
+                if measure == "mean":
+                    results[measure] = means
+                    continue
+                deviations = values - means[segments]
+                squares = segment_sums(segments, deviations**2, n_segments)
+                std = np.sqrt(squares / (counts - 1))
+            std[counts < 2] = np.nan
+            results[measure] = std
+        elif measure in ("min", "max"):
+            ufunc = np.minimum if measure == "min" else np.maximum
+            if integer:
+                extremes = np.zeros(n_segments, dtype=values.dtype)
+            else:
+                extremes = np.full(n_segments, np.nan)
+            if len(values):
+                extremes[filled] = ufunc.reduceat(values, starts)
+            results[measure] = extremes
+        elif measure == "median":
+            order = np.lexsort((values, segments))
+            ordered = values[order].astype(np.float64)
+            medians = np.full(n_segments, np.nan)
+            n = counts[filled]
+            medians[filled] = (
+                ordered[starts + (n - 1) // 2] + ordered[starts + n // 2]
+            ) / 2
+            results[measure] = medians
+        else:
+            raise ValueError(f"Unsupported measure: {measure}")
+
+    return results
+
+
+def forward_fill(values: np.ndarray) -> np.ndarray:
+    "Replace each NaN by the last value before it, like Series.ffill()"
+    if values.dtype.kind != "f":
+        return values
+    positions = np.where(np.isnan(values), 0, np.arange(len(values)))
+    np.maximum.accumulate(positions, out=positions)
+    # Leading NaN point at position 0, which is NaN itself
+    return values[positions]
+
+
+def source_rows(
+    data: pd.DataFrame, date_col: str, source_col: str, value_col: str
+) -> Optional[Tuple[np.ndarray, np.ndarray, np.ndarray, int]]:
+    """
+    Source code, local time (see local_nanoseconds) and value of each row
+    that has a source, sorted by source, and the number of sources. None
+    if the rows cannot be binned here or there are none.
+    """
+    # Resampled integers become floats or stay integers depending on
+    # whether some bin is empty, so only float values are handled
+    if len(data) == 0 or not pd.api.types.is_float_dtype(data[value_col]):
+        return None
+    local = local_nanoseconds(data[date_col])
+    if local is None:
+        return None
+
+    sources = data[source_col]
+    if isinstance(sources.dtype, pd.CategoricalDtype):
+        groups = sources.cat.codes.to_numpy().astype(np.int64)
+    else:
+        groups = pd.factorize(sources, sort=True)[0].astype(np.int64)
+    values = data[value_col].to_numpy()
+    keep = groups >= 0  # like groupby, rows without a source are dropped
+    if not keep.all():
+        groups, local, values = groups[keep], local[keep], values[keep]
+    if len(groups) == 0:
+        return None
+
+    n_groups = int(groups.max()) + 1
+    if n_groups > 1:
+        # Rows sorted by time are sorted by bin once sorted by source, and a
+        # stable sort of small integers is a radix sort
+        key = groups.astype(np.int16) if n_groups <= 2**15 else groups
+        order = np.argsort(key, kind="stable")
+        groups, local, values = groups[order], local[order], values[order]
+
+    return groups, local, values, n_groups
+
+
+def source_bins(
+    groups: np.ndarray,
+    local: np.ndarray,
+    n_groups: int,
+    bins: Tuple[Callable, Callable],
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Lay out the bins of every source one after the other, each source
+    covering the bins from its first to its last time (see calendar_bins
+    for bins). Returns the slot of each row in that layout and the label
+    of each slot (local ns).
+    """
+    bin_ids, bin_labels = bins
+    rows = np.bincount(groups, minlength=n_groups)
+    present = rows > 0
+    row_starts = (np.cumsum(rows) - rows)[present]
+    first = np.zeros(n_groups, dtype=np.int64)
+    first[present] = np.minimum.reduceat(local, row_starts)
+    origins = (first // NS_PER_DAY) * NS_PER_DAY
+
+    ids = bin_ids(local, origins[groups])
+    low = np.zeros(n_groups, dtype=np.int64)
+    high = np.full(n_groups, -1, dtype=np.int64)
+    low[present] = np.minimum.reduceat(ids, row_starts)
+    high[present] = np.maximum.reduceat(ids, row_starts)
+    sizes = high - low + 1
+    starts = np.cumsum(sizes) - sizes
+    n_slots = int(sizes.sum())
+    slots = starts[groups] + ids - low[groups]
+
+    slot_groups = np.repeat(np.arange(n_groups), sizes)
+    slot_ids = np.arange(n_slots) - starts[slot_groups] + low[slot_groups]
+    return slots, bin_labels(slot_ids, origins[slot_groups])
+
+
+def summarize_sources(
+    per_source: np.ndarray,
+    slot_labels: np.ndarray,
+    measures: List[str],
+    ffill: bool,
+    tz: Optional[datetime.tzinfo],
+) -> pd.DataFrame:
+    """
+    Frame of summarize_time_bins from the aggregated value of every slot
+    of source_bins
+    """
+    if ffill:
+        per_source = forward_fill(per_source)
+
+    labels, dates = np.unique(slot_labels, return_inverse=True)
+    summary = reduce_segments(
+        dates.reshape(-1).astype(np.int64), per_source, len(labels), measures
+    )
+
+    start_date = pd.DatetimeIndex(labels.view("datetime64[ns]"))
+    if tz is not None:
+        start_date = start_date.tz_localize(tz)
+
+    result = pd.DataFrame({"start_date": start_date})
+    for measure in measures:
+        result[measure] = summary[measure]
+    return result
+
+
+def summarize_time_bins(
+    data: pd.DataFrame,
+    interval: str,
+    agg_sources: str,
+    measures: List[str],
+    ffill: bool = False,
+    date_col: str = "startDate",
+    source_col: str = "sourceName",
+    value_col: str = "value",
+) -> Optional[pd.DataFrame]:
+    """
+    Same frame as TypeSummary's pandas summary before normalization:
+        data.set_index(date_col).groupby(source_col)[value_col]
+            .resample(interval).apply(agg_sources)
+    optionally forward filled across the flattened result, then grouped
+    by date and aggregated with measures, with a start_date column and a
+    column per measure. Returns None if something is not supported (see
+    the module docstring), or if data is empty.
+    """
+    if agg_sources not in MEASURES or any(m not in MEASURES for m in measures):
+        return None
+    bins = calendar_bins(interval)
+    rows = source_rows(data, date_col, source_col, value_col)
+    if bins is None or rows is None:
+        return None
+    groups, local, values, n_groups = rows
+
+    slots, slot_labels = source_bins(groups, local, n_groups, bins)
+    per_source = reduce_segments(slots, values, len(slot_labels), [agg_sources])
+    tz = getattr(data[date_col].dtype, "tz", None)
+    return summarize_sources(per_source[agg_sources], slot_labels, measures, ffill, tz)
+
+
+def interval_step(interval: str) -> Optional[int]:
+    """
+    Length in ns of the bins of an interval that calendar_bins supports,
+    one day for calendar periods (which are made of whole days)
+    """
+    if calendar_bins(interval) is None:
+        return None
+    offset = to_offset(interval)
+    return offset.nanos if isinstance(offset, Tick) else NS_PER_DAY
+
+
+def bin_partials(
+    segments: np.ndarray, values: np.ndarray, n_segments: int
+) -> Dict[str, np.ndarray]:
+    """
+    Partial aggregates of the values of each segment, from which those of
+    unions of segments follow (see combine_partials): the number of rows
+    (NaN included), count, sum, sum of squared deviations from the mean
+    (m2), min and max.
+    """
+    partials = reduce_segments(
+        segments, values, n_segments, ["count", "sum", "mean", "min", "max"]
+    )
+    with np.errstate(invalid="ignore"):
+        deviations = values - partials.pop("mean")[segments]
+    present = ~np.isnan(deviations)
+    partials["m2"] = segment_sums(
+        segments[present], deviations[present] ** 2, n_segments
+    )
+    partials["rows"] = np.bincount(segments, minlength=n_segments)
+    return partials
+
+
+def combine_partials(
+    segments: np.ndarray,
+    partials: Dict[str, np.ndarray],
+    n_segments: int,
+    measure: str,
+) -> np.ndarray:
+    """
+    measure of each segment of the values summarized by partials (see
+    bin_partials), with segments sorted. Same results as reduce_segments
+    on the values, up to the order of floating-point sums.
+    """
+    counts = np.bincount(segments, weights=partials["count"], minlength=n_segments)
+    counts = counts.astype(np.int64)
+    if measure == "count":
+        return counts
+    sums = segment_sums(segments, partials["sum"], n_segments)
+    if measure == "sum":
+        return sums
+
+    with np.errstate(invalid="ignore", divide="ignore"):
+        means = sums / counts
+        if measure == "mean":
+            return means
+        if measure == "std":
+            # Chan et al.'s pairwise update of the sum of squared deviations
+            filled = partials["count"] > 0
+            shift = partials["sum"][filled] / partials["count"][filled] - (
+                means[segments[filled]]
+            )
+            m2 = segment_sums(segments, partials["m2"], n_segments) + segment_sums(
+                segments[filled], partials["count"][filled] * shift**2, n_segments
+            )
+            std = np.sqrt(m2 / (counts - 1))
+            std[counts < 2] = np.nan
+            return std
+
+    if measure in ("min", "max"):
+        ufunc = np.fmin if measure == "min" else np.fmax  # skip empty bins
+        sizes = np.bincount(segments, minlength=n_segments)
+        extremes = np.full(n_segments, np.nan)
+        has_rows = sizes > 0
+        starts = (np.cumsum(sizes) - sizes)[has_rows]
+        extremes[has_rows] = ufunc.reduceat(partials[measure], starts)
+        return extremes
+
+    raise ValueError(f"Measure {measure} cannot be combined from partials")
+
+
+def summarize_sweep_bins(
+    data: pd.DataFrame,
+    intervals: List[str],
+    agg_sources: str,
+    measures: List[str],
+    ffill: bool = False,
+    date_col: str = "startDate",
+    source_col: str = "sourceName",
+    value_col: str = "value",
+) -> Dict[str, Optional[pd.DataFrame]]:
+    """
+    summarize_time_bins for each of intervals, in about one pass over the
+    data: partial aggregates (see bin_partials) are computed once per bin
+    of the largest step that divides every interval, and rolled up to each
+    interval. Fixed intervals and calendar periods both start at midnight,
+    so each of their bins is a union of those bins. agg_sources that do
+    not roll up (median) are computed from the data for every interval.
+    Intervals that are not supported map to None.
+    """
+    results = {interval: None for interval in intervals}
+    steps = {interval: interval_step(interval) for interval in intervals}
+    supported = [interval for interval, step in steps.items() if step is not None]
+    if agg_sources not in MEASURES or any(m not in MEASURES for m in measures):
+        return results
+    rows = source_rows(data, date_col, source_col, value_col)
+    if not supported or rows is None:
+        return results
+    groups, local, values, n_groups = rows
+    tz = getattr(data[date_col].dtype, "tz", None)
+
+    base_step = int(np.gcd.reduce([steps[interval] for interval in supported]))
+    base_slots, base_labels = source_bins(
+        groups, local, n_groups, calendar_bins(f"{base_step}N")
+    )
+    if agg_sources == "median" or len(supported) == 1 or len(base_labels) > len(values):
+        # Nothing to gain from partials
+        for interval in supported:
+            slots, labels = source_bins(groups, local, n_groups, calendar_bins(interval))
+            per_source = reduce_segments(slots, values, len(labels), [agg_sources])
+            results[interval] = summarize_sources(
+                per_source[agg_sources], labels, measures, ffill, tz
+            )
+        return results
+
+    partials = bin_partials(base_slots, values, len(base_labels))
+    # The bins with rows, in source then time order, stand for the rows
+    occupied = partials["rows"] > 0
+    partials = {name: partial[occupied] for name, partial in partials.items()}
+    base_groups = np.zeros(len(base_labels), dtype=np.int64)
+    base_groups[base_slots] = groups
+    base_groups, base_local = base_groups[occupied], base_labels[occupied]
+
+    for interval in supported:
+        slots, labels = source_bins(
+            base_groups, base_local, n_groups, calendar_bins(interval)
+        )
+        per_source = combine_partials(slots, partials, len(labels), agg_sources)
+        results[interval] = summarize_sources(per_source, labels, measures, ffill, tz)
+
+    return results
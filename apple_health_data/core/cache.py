@@ -0,0 +1,115 @@
+"""
+Persistent cache of TypeSummary results.
+
+Summaries are stored as Parquet files in a cache directory, named by a
+content address: TypeSummary.fingerprint, a digest of the wrangled
+data's fingerprint and of the settings the summary depends on.
+Entries are never invalidated, a change of data or settings gives a new
+address. When the directory grows past max_bytes the least recently used
+entries (by modification time, which hits refresh) are evicted.
+
+Writes go through a temporary file and an atomic rename, so processes
+summarizing in parallel can share a cache directory.
+"""
+import os
+import uuid
+
+import pandas as pd
+
+from pathlib import Path
+
+from typing import Any, Dict, Optional, Union
+from apple_health_data.core.logger import VerbosityLogger
+from apple_health_data.utils import restore_timezones
+
+CACHE_SUFFIX = ".parquet"
+DEFAULT_MAX_BYTES = 1024 * 2**20
+
+
+class SummaryCache:
+    """
+    Summaries in directory, evicted least recently used first beyond
+    max_bytes. hits, misses and evictions count the lookups and
+    evictions of this instance.
+    """
+
+    def __init__(
+        self,
+        directory: Union[str, os.PathLike],
+        max_bytes: int = DEFAULT_MAX_BYTES,
+        vlogger: Union[VerbosityLogger, None] = None,
+    ):
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = max_bytes
+        self.vlogger = vlogger
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __getstate__(self) -> Dict[str, Any]:
+        # Sent to worker processes, which log to their own logger
+        state = self.__dict__.copy()
+        state["vlogger"] = None
+        return state
+
+    @property
+    def stats(self) -> Dict[str, int]:
+        return {"hits": self.hits, "misses": self.misses, "evictions": self.evictions}
+
+    def path(self, key: str) -> Path:
+        return self.directory / f"{key}{CACHE_SUFFIX}"
+
+    def __contains__(self, key: str) -> bool:
+        "Whether key is cached, without counting a lookup"
+        return self.path(key).exists()
+
+    def get(self, key: str) -> Optional[pd.DataFrame]:
+        "Cached summary for key, or None. Unreadable entries are dropped."
+        path = self.path(key)
+        try:
+            df = pd.read_parquet(path)
+            os.utime(path)
+        except FileNotFoundError:
+            self.misses += 1
+            return None
+        except Exception as e:
+            if self.vlogger is not None:
+                self.vlogger.warning(f"Dropping unreadable cache entry {path}: {e}", 1)
+            path.unlink(missing_ok=True)
+            self.misses += 1
+            return None
+
+        self.hits += 1
+        return restore_timezones(df)
+
+    def put(self, key: str, df: pd.DataFrame) -> None:
+        "Cache df for key, then evict entries beyond max_bytes"
+        path = self.path(key)
+        temporary = path.with_name(f".{path.name}.{uuid.uuid4().hex}")
+        try:
+            df.to_parquet(temporary, index=False)
+            os.replace(temporary, path)
+        finally:
+            temporary.unlink(missing_ok=True)
+        self.evict()
+
+    def evict(self) -> None:
+        "Remove the least recently used entries until the cache fits max_bytes"
+        entries = []
+        for path in self.directory.glob(f"*{CACHE_SUFFIX}"):
+            try:
+                status = path.stat()
+            except FileNotFoundError:  # evicted by another process
+                continue
+            entries.append((status.st_mtime, status.st_size, path))
+
+        size = sum(entry[1] for entry in entries)
+        for _, entry_size, path in sorted(entries):
+            if size <= self.max_bytes:
+                break
+            path.unlink(missing_ok=True)
+            size -= entry_size
+            self.evictions += 1
+            if self.vlogger is not None:
+                self.vlogger.debug(f"Evicted {path} from summary cache", 2)
@@ -0,0 +1,247 @@
+"""
+Extract the electrocardiograms in Apple Health App's export.zip.
+
+Each ECG recording is a CSV member of the electrocardiograms folder of the
+export: a few lines of header metadata (recorded date, classification,
+sample rate, ...), a blank line, the Lead and Unit lines, another blank
+line, then one voltage sample per line. The members are parsed in parallel into a store directory holding
+    samples.f32:   the samples of every recording, back to back, as raw
+                   float32 that can be memory-mapped
+    index.parquet: one row per recording, sorted by recordedDate, with
+                   its metadata (see ECG_FIELDS) and the offset and
+                   length of its samples in samples.f32
+so a single waveform is loaded by mapping its slice of samples.f32,
+without reading any of the others.
+"""
+import csv
+import io
+import os
+import zipfile
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+from typing import Any, Dict, List, Optional, Tuple, Union
+from apple_health_data.core.logger import VerbosityLogger
+from apple_health_data.core.parser import OFFSET_SUFFIX, decode_date
+from apple_health_data.core.routes import batch_members
+from apple_health_data.utils import decode_epoch_columns
+
+
+ECG_FOLDER = "electrocardiograms"
+# First characters of a sample line, besides digits, after any quote
+SAMPLE_STARTS = ("-", "+", ".")
+SAMPLES_FILENAME = "samples.f32"
+INDEX_FILENAME = "index.parquet"
+
+# Header fields kept in the index, by their name in the CSV files. Name and
+# Date of Birth are left out, they are the same for every recording.
+ECG_FIELDS = {
+    "Recorded Date": "recordedDate",
+    "Classification": "classification",
+    "Symptoms": "symptoms",
+    "Software Version": "softwareVersion",
+    "Device": "device",
+    "Sample Rate": "sampleRate",
+    "Lead": "lead",
+    "Unit": "unit",
+}
+
+INDEX_SCHEMA = pa.schema(
+    [
+        ("recordedDate", pa.int64()),
+        ("recordedDate" + OFFSET_SUFFIX, pa.int16()),
+        ("file", pa.string()),
+        ("offset", pa.int64()),
+        ("length", pa.int64()),
+        ("classification", pa.string()),
+        ("symptoms", pa.string()),
+        ("softwareVersion", pa.string()),
+        ("device", pa.string()),
+        ("sampleRate", pa.float64()),
+        ("lead", pa.string()),
+        ("unit", pa.string()),
+    ]
+)
+
+
+def find_ecg_members(zip_file: zipfile.ZipFile) -> List[str]:
+    "CSV members of the electrocardiograms folder of an export.zip, in zip order"
+    return [
+        name
+        for name in zip_file.namelist()
+        if name.lower().endswith(".csv") and f"/{ECG_FOLDER}/" in f"/{name}"
+    ]
+
+
+def parse_ecg(data: bytes) -> Tuple[Dict[str, Any], np.ndarray]:
+    """
+    Parse an ECG CSV file into its metadata, keyed as in ECG_FIELDS, and
+    its voltage samples as float32. The file is read line by line: rows
+    whose first cell is a header field go to the metadata, wherever they
+    are (the Health app separates the Lead and Unit rows from the others
+    by a blank line), and lines that start like a number are samples.
+    Anything else, such as blank lines, is skipped. Samples written with a
+    decimal comma (e.g. "-78,123" in some locales) are read as well.
+    """
+    text = data.decode("utf-8-sig").replace("\r\n", "\n")
+
+    metadata = {field: None for field in ECG_FIELDS.values()}
+    sample_lines = []
+    for line in text.split("\n"):
+        key = line.partition(",")[0].strip('"')
+        if key in ECG_FIELDS:
+            row = next(csv.reader([line]))
+            metadata[ECG_FIELDS[key]] = ",".join(row[1:]).strip() or None
+            continue
+        first = line.lstrip('"')[:1]
+        if first.isdigit() or first in SAMPLE_STARTS:
+            sample_lines.append(line)
+
+    if metadata["sampleRate"] is not None:
+        metadata["sampleRate"] = float(
+            metadata["sampleRate"].split()[0].replace(",", ".")
+        )
+    body = "\n".join(sample_lines)
+    if "," in body:
+        body = body.replace('"', "").replace(",", ".")
+    samples = np.array(body.split(), dtype=np.float32)
+
+    return metadata, samples
+
+
+def read_ecgs(
+    export_zip: Union[str, os.PathLike], members: List[str]
+) -> List[Tuple[str, Optional[Dict[str, Any]], Optional[np.ndarray], Optional[str]]]:
+    """
+    Worker for extract_ecgs: parse a batch of ECG members, opening the zip
+    once per batch. Returns (member, metadata, samples, error) for each
+    member, with recordedDate decoded as in the parser's Parquet output;
+    a member that cannot be parsed gets an error instead.
+    """
+    results = []
+    with zipfile.ZipFile(export_zip, "r") as zip_file:
+        for member in members:
+            try:
+                metadata, samples = parse_ecg(zip_file.read(member))
+                if metadata["recordedDate"] is None:
+                    raise ValueError("no Recorded Date")
+                (
+                    metadata["recordedDate"],
+                    metadata["recordedDate" + OFFSET_SUFFIX],
+                ) = decode_date(metadata["recordedDate"])
+            except (UnicodeDecodeError, ValueError) as e:
+                results.append((member, None, None, str(e)))
+                continue
+            results.append((member, metadata, samples, None))
+
+    return results
+
+
+def extract_ecgs(
+    export_zip: Union[str, os.PathLike],
+    store_directory: Union[str, os.PathLike],
+    workers: Optional[int] = None,
+    vlogger: Union[VerbosityLogger, None] = None,
+) -> Dict[str, int]:
+    """
+    Parse every electrocardiograms/*.csv member of export_zip into the
+    store in store_directory (see the module docstring), replacing any
+    previous contents. Batches of members are parsed in a pool of workers
+    processes (all CPUs by default); with workers=1 they are parsed in
+    this process. Nothing is written if the export has no ECGs. Returns
+    the number of recordings and samples written and members that could
+    not be parsed.
+    """
+    workers = workers or os.cpu_count() or 1
+    with zipfile.ZipFile(export_zip, "r") as zip_file:
+        members = find_ecg_members(zip_file)
+    stats = {"recordings": 0, "samples": 0, "failed": 0}
+    if not members:
+        return stats
+
+    batches = batch_members(members, workers)
+    if workers > 1:
+        executor = ProcessPoolExecutor(max_workers=workers)
+        results = executor.map(read_ecgs, [export_zip] * len(batches), batches)
+    else:
+        executor = None
+        results = (read_ecgs(export_zip, batch) for batch in batches)
+
+    store_directory = Path(store_directory)
+    store_directory.mkdir(parents=True, exist_ok=True)
+    index = {field.name: [] for field in INDEX_SCHEMA}
+    try:
+        with open(store_directory / SAMPLES_FILENAME, "wb") as f:
+            for batch in results:
+                for member, metadata, samples, error in batch:
+                    if samples is None:
+                        stats["failed"] += 1
+                        if vlogger is not None:
+                            vlogger.warning(f"Skipping ECG {member}: {error}", 1)
+                        continue
+                    index["file"].append(member.rpartition("/")[2])
+                    index["offset"].append(stats["samples"])
+                    index["length"].append(len(samples))
+                    for field, value in metadata.items():
+                        index[field].append(value)
+                    f.write(samples.tobytes())
+                    stats["recordings"] += 1
+                    stats["samples"] += len(samples)
+    finally:
+        if executor is not None:
+            executor.shutdown()
+
+    table = pa.table(index, schema=INDEX_SCHEMA)
+    table = table.sort_by([("recordedDate", "ascending"), ("file", "ascending")])
+    pq.write_table(table, store_directory / INDEX_FILENAME)
+
+    return stats
+
+
+def read_ecg_index(store_directory: Union[str, os.PathLike]) -> pd.DataFrame:
+    "Index of an ECG store, with recordedDate as datetimes"
+    index = pd.read_parquet(Path(store_directory) / INDEX_FILENAME)
+    return decode_epoch_columns(index)
+
+
+def load_ecg(
+    store_directory: Union[str, os.PathLike],
+    recorded_date: Union[str, pd.Timestamp],
+    index: Optional[pd.DataFrame] = None,
+) -> Tuple[Dict[str, Any], np.memmap]:
+    """
+    Metadata and samples of the recording made at recorded_date (e.g.
+    "2023-05-01 08:00:00 -0400"). The samples are a read-only float32
+    memory map of their slice of samples.f32, so only the pages that are
+    used are read. Pass the index (see read_ecg_index) when loading many
+    recordings. Raises KeyError if no recording was made at that date.
+    """
+    if index is None:
+        index = read_ecg_index(store_directory)
+    when = pd.Timestamp(recorded_date)
+    dates = index["recordedDate"]
+    if dates.dt.tz is None:  # local times, see epoch_to_datetime
+        when = when.tz_localize(None)
+    elif when.tzinfo is None:
+        when = when.tz_localize(dates.dt.tz)
+    matches = index.index[dates == when]
+    if len(matches) == 0:
+        raise KeyError(f"No ECG recorded at {recorded_date}")
+
+    row = index.loc[matches[0]]
+    if row["length"] == 0:
+        return row.to_dict(), np.empty(0, dtype=np.float32)
+    samples = np.memmap(
+        Path(store_directory) / SAMPLES_FILENAME,
+        dtype=np.float32,
+        mode="r",
+        offset=int(row["offset"]) * np.dtype(np.float32).itemsize,
+        shape=(int(row["length"]),),
+    )
+    return row.to_dict(), samples
@@ -6,9 +6,17 @@ Licence: MIT
 """
 import os
 import re
+import shutil
+import sys
+import tempfile
+import zipfile
 
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
+from datetime import date, datetime
+from functools import lru_cache
 from xml.etree import ElementTree
-from collections import Counter, OrderedDict
+from collections import Counter, OrderedDict, namedtuple
 
 from typing import Union
 from apple_health_data.core.logger import VerbosityLogger
@@ -67,10 +75,67 @@ FIELDS = {
     "Workout": WORKOUT_FIELDS,
 }
 
+# Lightweight, tuple-based rows yielded by iter_records()
+ROW_TYPES = {
+    tag: namedtuple(tag, list(fields.keys())) for (tag, fields) in FIELDS.items()
+}
+
+DATE_FORMAT = "%Y-%m-%d %H:%M:%S %z"
+
 
 PREFIX_RE = re.compile("^HK.*TypeIdentifier(.+)$")
 ABBREVIATE = True
 
+EXPORT_XML_MEMBER = "apple_health_export/export.xml"
+
+CHUNK_TAGS = (b"Record", b"Workout", b"ActivitySummary")
+BLOCK_SIZE = 1 << 20
+
+OUTPUT_FORMATS = ("csv", "parquet")
+BATCH_SIZE = 65536
+MAX_OPEN_FILES = 64
+WRITE_BUFFER_SIZE = 1 << 18
+EPOCH_ORDINAL = date(1970, 1, 1).toordinal()
+OFFSET_SUFFIX = "Offset"
+
+# Long, highly repetitive string fields (the device of every heart rate
+# sample can be hundreds of characters), interned by iter_records and
+# dictionary-encoded in Parquet output
+DICTIONARY_FIELDS = ("sourceName", "sourceVersion", "device", "type", "unit")
+
+# Child elements extracted into their own tables when nested is set,
+# keyed back to the parent node by RECORD_ID, with their columns' Arrow
+# types (pyarrow is only imported once Parquet is written)
+RECORD_ID = "recordId"
+NESTED_TABLES = OrderedDict(
+    (
+        (
+            "MetadataEntry",
+            ((RECORD_ID, "int64"), ("key", "string"), ("value", "string")),
+        ),
+        (
+            "InstantaneousBeatsPerMinute",
+            ((RECORD_ID, "int64"), ("bpm", "int16"), ("time", "int32")),
+        ),
+        (
+            "WorkoutRoute",
+            ((RECORD_ID, "int64"), ("path", "string")),
+        ),
+    )
+)
+BEAT_TIME_RE = re.compile(r"^(\d{1,2}):(\d{2}):(\d{2}(?:\.\d+)?)\s*([AaPp][Mm])?$")
+
+# Dates that order the records of each tag for incremental extraction
+WATERMARK_FIELDS = {
+    "Record": ("creationDate", "startDate"),
+    "Workout": ("creationDate", "startDate"),
+    "ActivitySummary": ("dateComponents",),
+}
+# Tags dated by day only: the summary of the export's last day is partial
+# and completed by the next export, so incremental extraction replaces the
+# rows of the watermark day instead of skipping its newer values
+DAY_WATERMARK_TAGS = ("ActivitySummary",)
+
 
 def format_freqs(counter):
     """
@@ -87,9 +152,12 @@ def format_value(value, datatype):
         's' for string (escaped)
         'n' for number
         'd' for datetime
+        'i' for integer (not a string)
     """
     if value is None:
         return ""
+    elif datatype == "i":  # integer
+        return "%d" % value
     elif datatype == "s":  # string
         return '"%s"' % value.replace("\\", "\\\\").replace('"', '\\"')
     elif datatype in ("n", "d"):  # number or date
@@ -98,6 +166,188 @@ def format_value(value, datatype):
         raise KeyError("Unexpected format value: %s" % datatype)
 
 
+def find_export_xml_member(zip_file):
+    """
+    Name of the export.xml member of an export.zip, or None if missing.
+    """
+    names = zip_file.namelist()
+    if EXPORT_XML_MEMBER in names:
+        return EXPORT_XML_MEMBER
+    for name in names:
+        if name.endswith("/export.xml"):
+            return name
+    return None
+
+
+@contextmanager
+def open_export_xml(path):
+    """
+    Open export.xml for binary reading. path may be export.xml itself or
+    the export.zip produced by the Health app, in which case the XML
+    member is decompressed on the fly as it is read, without writing it
+    to disk first.
+    """
+    if zipfile.is_zipfile(path):
+        with zipfile.ZipFile(path, "r") as zip_file:
+            member = find_export_xml_member(zip_file)
+            if member is None:
+                raise FileNotFoundError("No export.xml found in %s" % path)
+            with zip_file.open(member) as f:
+                yield f
+    else:
+        with open(path, "rb") as f:
+            yield f
+
+
+def iter_export_nodes(path):
+    """
+    Incrementally parse export.xml (or export.zip), yielding each
+    top-level node once it has been read completely. The node, and the
+    root's reference to it, are cleared as soon as the caller moves on.
+    """
+    with open_export_xml(path) as f:
+        root = None
+        depth = 0
+        for event, node in ElementTree.iterparse(f, events=("start", "end")):
+            if event == "start":
+                if root is None:
+                    root = node
+                depth += 1
+                continue
+            depth -= 1
+            if depth == 1:
+                yield node
+                node.clear()
+                root.clear()
+
+
+def find_chunk_boundaries(path, n_chunks):
+    """
+    Split the body of export.xml (the children of <HealthData>) into at
+    most n_chunks byte ranges, each starting at a top-level Record,
+    Workout or ActivitySummary element, so that every range can be
+    parsed on its own. Top-level elements are recognised by their
+    indentation, which is shallower than that of nested elements such as
+    the Records inside a Correlation. Returns a list of (start, end)
+    offsets, or a single range if no safe split points are found.
+    """
+    size = os.path.getsize(path)
+    with open(path, "rb") as f:
+        head = f.read(min(size, BLOCK_SIZE))
+        root_start = head.find(b"<HealthData")
+        if root_start == -1:
+            raise ValueError("No <HealthData> element found in %s" % path)
+        body_start = head.index(b">", root_start) + 1
+        f.seek(max(0, size - BLOCK_SIZE))
+        tail = f.read()
+        body_end = size - len(tail) + tail.rindex(b"</HealthData>")
+
+        first_child = re.compile(rb"\n([ \t]+)<[A-Za-z]").search(head, body_start)
+        if first_child is None or n_chunks < 2:
+            return [(body_start, body_end)]
+        boundary_re = re.compile(
+            rb"\n"
+            + re.escape(first_child.group(1))
+            + rb"<(?:"
+            + b"|".join(CHUNK_TAGS)
+            + rb")[\s/>]"
+        )
+
+        boundaries = [body_start]
+        step = (body_end - body_start) // n_chunks
+        for i in range(1, n_chunks):
+            position = max(body_start + i * step, boundaries[-1])
+            f.seek(position)
+            block = f.read(BLOCK_SIZE)
+            while block:
+                match = boundary_re.search(block)
+                if match is not None:
+                    boundary = position + match.start() + 1
+                    break
+                # Keep a margin so a boundary straddling two blocks is found
+                position += max(1, len(block) - 64)
+                f.seek(position)
+                block = f.read(BLOCK_SIZE)
+            else:
+                break
+            if boundary >= body_end:
+                break
+            if boundary > boundaries[-1]:
+                boundaries.append(boundary)
+        boundaries.append(body_end)
+
+    return list(zip(boundaries[:-1], boundaries[1:]))
+
+
+def iter_chunk_nodes(path, start, end):
+    """
+    Incrementally parse the byte range [start, end) of export.xml, which
+    must hold complete top-level elements (see find_chunk_boundaries),
+    yielding and then clearing each of them like iter_export_nodes().
+    """
+    parser = ElementTree.XMLPullParser(events=("start", "end"))
+    state = {"root": None, "depth": 0}
+
+    def top_level_nodes():
+        for event, node in parser.read_events():
+            if event == "start":
+                if state["root"] is None:
+                    state["root"] = node
+                state["depth"] += 1
+                continue
+            state["depth"] -= 1
+            if state["depth"] == 1:
+                yield node
+                node.clear()
+                state["root"].clear()
+
+    parser.feed(b"<HealthData>")
+    with open(path, "rb") as f:
+        f.seek(start)
+        remaining = end - start
+        while remaining > 0:
+            block = f.read(min(BLOCK_SIZE, remaining))
+            if not block:
+                break
+            remaining -= len(block)
+            parser.feed(block)
+            for node in top_level_nodes():
+                yield node
+    parser.feed(b"</HealthData>")
+    for node in top_level_nodes():
+        yield node
+    parser.close()
+
+
+def extract_chunk(
+    path, start, end, part_directory, filters, output_format, watermarks
+):
+    """
+    Worker for HealthDataExtractor's parallel mode: extract the nodes in
+    one byte range into part_directory and return what the parent needs
+    to merge it.
+    """
+    extractor = HealthDataExtractor(
+        path,
+        target_directory=part_directory,
+        streaming=True,
+        output_format=output_format,
+        watermarks=watermarks,
+        **filters
+    )
+    extractor.write_records(iter_chunk_nodes(path, start, end))
+    extractor.close_files()
+    return {
+        "n_nodes": extractor.n_nodes,
+        "kinds": list(extractor.handles),
+        "tags": extractor.tags,
+        "fields": extractor.fields,
+        "record_types": extractor.record_types,
+        "other_types": extractor.other_types,
+        "watermarks": extractor.watermarks,
+    }
+
+
 def abbreviate(s, enabled=ABBREVIATE):
     """
     Abbreviate particularly verbose strings based on a regular expression
@@ -106,16 +356,555 @@ def abbreviate(s, enabled=ABBREVIATE):
     return m.group(1) if enabled and m else s
 
 
+def type_key(name):
+    """
+    Normalize a type name so that raw HK identifiers, abbreviated names
+    and parsed file stems compare equal, e.g.
+    HKQuantityTypeIdentifierActiveEnergyBurned, ActiveEnergyBurned and
+    active-energy-burned all map to activeenergyburned.
+    """
+    return re.sub("[^0-9a-z]", "", abbreviate(name).lower())
+
+
+def parse_date(value):
+    """
+    Parse a date as written in export.xml, e.g. 2023-05-01 08:00:00 -0400.
+    """
+    return datetime.strptime(value, DATE_FORMAT)
+
+
+@lru_cache(maxsize=65536)
+def epoch_day(value):
+    return date.fromisoformat(value).toordinal() - EPOCH_ORDINAL
+
+
+@lru_cache(maxsize=None)
+def offset_minutes(value):
+    minutes = int(value[1:3]) * 60 + int(value[3:5])
+    return -minutes if value[0] == "-" else minutes
+
+
+def decode_date(value):
+    """
+    Decode a fixed-format export.xml date, e.g. 2023-05-01 08:00:00 -0400,
+    into (nanoseconds since the epoch in UTC, UTC offset in minutes)
+    without going through datetime. Plain dates (dateComponents) are
+    taken as midnight UTC.
+    """
+    days = epoch_day(value[:10])
+    if len(value) == 10:
+        return days * 86400 * 1000000000, 0
+    seconds = int(value[11:13]) * 3600 + int(value[14:16]) * 60 + int(value[17:19])
+    offset = offset_minutes(value[20:25])
+    return (days * 86400 + seconds - offset * 60) * 1000000000, offset
+
+
+def parse_int(value):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def time_of_day_ms(value):
+    """
+    Milliseconds since local midnight of a heartbeat time as written in
+    export.xml, either 12-hour (2:35:22.55 PM) or 24-hour (14:35:22.55)
+    depending on the phone's locale. None if the time cannot be read.
+    """
+    m = BEAT_TIME_RE.match(value or "")
+    if m is None:
+        return None
+    hours, minutes, seconds, meridiem = m.groups()
+    hours = int(hours)
+    if meridiem is not None:
+        hours = hours % 12 + (12 if meridiem.upper() == "PM" else 0)
+    return (hours * 3600 + int(minutes) * 60) * 1000 + int(round(float(seconds) * 1000))
+
+
+def as_date_bound(bound):
+    if bound is None or isinstance(bound, datetime):
+        return bound
+    try:
+        return parse_date(bound)
+    except ValueError:
+        return datetime.fromisoformat(bound)
+
+
+class RecordFilter(object):
+    """
+    Predicate deciding which nodes to keep, applied to raw attributes
+    before any values are built or formatted. Cheap checks run first:
+    the decision for each distinct type is memoized, and dates are only
+    parsed for nodes that passed the type and source checks.
+    Inputs:
+        types:   Types to keep, as raw HK identifiers, abbreviated names or
+                 parsed file stems (see type_key). Workout and
+                 ActivitySummary are selected by their tag names.
+        start:   Keep nodes starting at or after this date
+        end:     Keep nodes starting before this date
+        sources: sourceName values to keep; nodes without a source
+                 (ActivitySummary) are not affected
+    Dates may be datetimes or strings; naive bounds are compared with the
+    local time of each record.
+    """
+
+    def __init__(self, types=None, start=None, end=None, sources=None):
+        self.type_keys = None if types is None else set(map(type_key, types))
+        self.start = as_date_bound(start)
+        self.end = as_date_bound(end)
+        self.sources = None if sources is None else set(sources)
+        self.decisions = {}
+
+    @property
+    def active(self):
+        return (
+            self.type_keys is not None
+            or self.sources is not None
+            or self.start is not None
+            or self.end is not None
+        )
+
+    def accepts_type(self, kind):
+        decision = self.decisions.get(kind)
+        if decision is None:
+            decision = self.decisions[kind] = (
+                self.type_keys is None or type_key(kind) in self.type_keys
+            )
+        return decision
+
+    def accepts_date(self, value):
+        if value is None:
+            return False
+        try:
+            date = parse_date(value)
+        except ValueError:
+            date = datetime.fromisoformat(value)
+        for bound, keep in ((self.start, 1), (self.end, -1)):
+            if bound is None:
+                continue
+            when = date
+            if bound.tzinfo is None:
+                when = date.replace(tzinfo=None)
+            elif when.tzinfo is None:
+                when = when.replace(tzinfo=bound.tzinfo)
+            if (keep > 0 and when < bound) or (keep < 0 and when >= bound):
+                return False
+        return True
+
+    def accepts(self, tag, attributes):
+        kind = attributes.get("type") if tag == "Record" else tag
+        if kind is None or not self.accepts_type(kind):
+            return False
+        if self.sources is not None:
+            source = attributes.get("sourceName")
+            if source is not None and source not in self.sources:
+                return False
+        if self.start is not None or self.end is not None:
+            date_field = "dateComponents" if tag == "ActivitySummary" else "startDate"
+            return self.accepts_date(attributes.get(date_field))
+        return True
+
+
+def iter_records(
+    path, types=None, start=None, end=None, sources=None, tags=("Record",)
+):
+    """
+    Generate the records in export.xml (or export.zip) as namedtuples
+    from ROW_TYPES, holding the raw attribute strings with abbreviated
+    types. Parsing is streamed, and nodes are filtered (see RecordFilter)
+    before any tuple is built, so selecting a few types out of a large
+    export is cheap. The strings of DICTIONARY_FIELDS are interned, so
+    rows that are kept share a single copy of each source and device.
+    Set tags to include Workout and ActivitySummary nodes as well.
+    """
+    record_filter = RecordFilter(types=types, start=start, end=end, sources=sources)
+    interned = {
+        tag: [field in DICTIONARY_FIELDS for field in fields]
+        for (tag, fields) in FIELDS.items()
+    }
+    abbreviations = {}
+    for node in iter_export_nodes(path):
+        tag = node.tag
+        if tag not in tags:
+            continue
+        attributes = node.attrib
+        if record_filter.active and not record_filter.accepts(tag, attributes):
+            continue
+        if tag == "Record" and "type" in attributes:
+            kind = attributes["type"]
+            short = abbreviations.get(kind)
+            if short is None:
+                short = abbreviations[kind] = abbreviate(kind)
+            attributes["type"] = short
+        values = [attributes.get(field) for field in FIELDS[tag]]
+        for i, intern in enumerate(interned[tag]):
+            if intern and values[i] is not None:
+                values[i] = sys.intern(values[i])
+        yield ROW_TYPES[tag]._make(values)
+
+
+class HandlePool(object):
+    """
+    File handles shared by many writers, with at most max_open of them
+    open at once. When another handle is needed the least recently used
+    one is closed, and reopened for appending if it is needed again.
+    With append set, existing files are appended to from the start.
+    """
+
+    def __init__(self, max_open=MAX_OPEN_FILES, append=False):
+        self.max_open = max_open
+        self.append = append
+        self.handles = OrderedDict()
+        self.opened = set()
+
+    def get(self, path):
+        f = self.handles.get(path)
+        if f is not None:
+            self.handles.move_to_end(path)
+            return f
+        if len(self.handles) >= self.max_open:
+            _, lru = self.handles.popitem(last=False)
+            lru.close()
+        f = open(path, "a" if self.append or path in self.opened else "w")
+        self.opened.add(path)
+        self.handles[path] = f
+        return f
+
+    def release(self, path):
+        f = self.handles.pop(path, None)
+        if f is not None:
+            f.close()
+
+    def close(self):
+        while self.handles:
+            _, f = self.handles.popitem()
+            f.close()
+
+
+class BufferedWriter(object):
+    """
+    File-like writer for one record type that collects text in memory
+    and hands it to a pooled handle in blocks of about buffer_size
+    characters, rather than issuing one small write per row.
+    """
+
+    def __init__(self, pool, path, buffer_size=WRITE_BUFFER_SIZE):
+        self.pool = pool
+        self.path = path
+        self.buffer_size = buffer_size
+        self.buffer = []
+        self.buffered = 0
+
+    def write(self, text):
+        self.buffer.append(text)
+        self.buffered += len(text)
+        if self.buffered >= self.buffer_size:
+            self.flush()
+
+    def flush(self):
+        if self.buffer:
+            self.pool.get(self.path).write("".join(self.buffer))
+            self.buffer = []
+            self.buffered = 0
+
+    def close(self):
+        self.flush()
+        self.pool.release(self.path)
+
+
+class ColumnarWriter(object):
+    """
+    Buffer one record type's rows as typed columns and write them to a
+    Parquet file in row groups of batch_size rows:
+        's' fields as strings
+        'n' fields as float64, or as strings once a value of the field is
+            not a number (e.g. the values of category records), in which
+            case the row groups already written are rewritten with the
+            field as strings
+        'd' fields as int64 nanoseconds since the epoch (UTC), plus an
+            int16 <field>Offset column holding the UTC offset in minutes
+        'i' fields (record ids) as int64
+    DICTIONARY_FIELDS are dictionary-encoded: each distinct string is
+    stored once per row group, and rows hold int32 codes (they load as
+    pandas categoricals).
+    With append set, the rows of an existing file at path are copied
+    over first, since Parquet files cannot be appended to in place.
+    Rows are written to <path>.partial, which replaces path on close, so
+    a run that fails part way leaves the existing file as it was.
+    """
+
+    def __init__(self, path, fields, batch_size=BATCH_SIZE, append=False):
+        self.path = path
+        self.fields = fields
+        self.batch_size = batch_size
+        self.numeric = {}
+        self.schema = None
+        self.writer = None
+        self.partial_path = path + ".partial"
+        self.reset()
+        if append and os.path.exists(path):
+            import pyarrow as pa
+
+            self.write_parts([path])
+            for field in self.schema:
+                if self.fields.get(field.name) == "n":
+                    self.numeric[field.name] = field.type != pa.string()
+
+    def reset(self):
+        self.columns = OrderedDict()
+        self.dictionaries = {}
+        for field, datatype in self.fields.items():
+            self.columns[field] = []
+            if datatype == "d":
+                self.columns[field + OFFSET_SUFFIX] = []
+            elif datatype == "s" and field in DICTIONARY_FIELDS:
+                self.dictionaries[field] = {}
+        self.n_buffered = 0
+
+    def append(self, attributes):
+        columns = self.columns
+        dictionaries = self.dictionaries
+        for field, datatype in self.fields.items():
+            value = attributes.get(field)
+            if field in dictionaries and value is not None:
+                dictionary = dictionaries[field]
+                code = dictionary.get(value)
+                if code is None:
+                    code = dictionary[value] = len(dictionary)
+                columns[field].append(code)
+            elif datatype == "d":
+                if value is None:
+                    epoch = offset = None
+                else:
+                    epoch, offset = decode_date(value)
+                columns[field].append(epoch)
+                columns[field + OFFSET_SUFFIX].append(offset)
+            else:
+                columns[field].append(value)
+        self.n_buffered += 1
+        if self.n_buffered >= self.batch_size:
+            self.flush()
+
+    def arrow_type(self, column):
+        import pyarrow as pa
+
+        if column.endswith(OFFSET_SUFFIX) and column not in self.fields:
+            return pa.int16()
+        datatype = self.fields[column]
+        if column in self.dictionaries:
+            return pa.dictionary(pa.int32(), pa.string())
+        elif datatype in ("d", "i"):
+            return pa.int64()
+        elif datatype == "n" and self.numeric.get(column, True):
+            return pa.float64()
+        return pa.string()
+
+    def numbers(self, field, values):
+        """
+        The buffered values of an 'n' field as float64, or as strings if
+        any of them is not a number, and then for the rest of the file
+        """
+        import pyarrow as pa
+
+        try:
+            numbers = [None if value is None else float(value) for value in values]
+        except ValueError:
+            self.numeric[field] = False
+            return pa.array(values, type=pa.string())
+        return pa.array(numbers, type=pa.float64())
+
+    def write_table(self, table):
+        import pyarrow.parquet as pq
+
+        if self.writer is None:
+            if self.schema is None:
+                self.schema = table.schema
+            self.writer = pq.ParquetWriter(self.partial_path, self.schema)
+        self.writer.write_table(table.cast(self.schema))
+
+    def flush(self):
+        import pyarrow as pa
+
+        if self.n_buffered == 0 and self.writer is not None:
+            return
+        arrays = []
+        for column, values in self.columns.items():
+            if column in self.dictionaries:
+                arrays.append(
+                    pa.DictionaryArray.from_arrays(
+                        pa.array(values, type=pa.int32()),
+                        pa.array(list(self.dictionaries[column]), type=pa.string()),
+                    )
+                )
+            elif self.fields.get(column) == "n" and self.numeric.get(column, True):
+                arrays.append(self.numbers(column, values))
+            else:
+                arrays.append(pa.array(values, type=self.arrow_type(column)))
+        table = pa.Table.from_arrays(arrays, names=list(self.columns))
+        self.reset()
+        if self.schema is not None and any(
+            field.type == pa.string() and self.schema.field(field.name).type != pa.string()
+            for field in table.schema
+        ):
+            self.rewrite()
+        self.write_table(table)
+
+    def rewrite(self):
+        """
+        Rewrite the row groups written so far with the 'n' fields that
+        turned out not to be numbers as strings
+        """
+        if self.writer is None:
+            self.schema = None
+            return
+        self.writer.close()
+        written = self.partial_path + ".numeric"
+        os.replace(self.partial_path, written)
+        self.writer = None
+        self.schema = None
+        self.write_parts([written])
+        os.remove(written)
+
+    def write_parts(self, paths):
+        """
+        Append the row groups of Parquet files written by other
+        ColumnarWriters for the same type, in order. A field stored as
+        strings in any part, or found not to be numeric here, is stored as
+        strings in all of them, including the row groups written so far.
+        """
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        if self.n_buffered:
+            self.flush()
+        schemas = [pq.read_schema(path) for path in paths]
+        if self.schema is not None:
+            schemas.append(self.schema)
+        fields = []
+        for field in schemas[0]:
+            if not self.numeric.get(field.name, True) or any(
+                schema.field(field.name).type == pa.string() for schema in schemas
+            ):
+                field = field.with_type(pa.string())
+            fields.append(field)
+        schema = pa.schema(fields)
+        if self.schema is not None and self.schema != schema:
+            for field in schema:
+                if field.type == pa.string() and self.fields.get(field.name) == "n":
+                    self.numeric[field.name] = False
+            self.rewrite()
+        self.schema = schema
+        for path in paths:
+            for batch in pq.ParquetFile(path).iter_batches(batch_size=self.batch_size):
+                self.write_table(pa.Table.from_batches([batch]))
+
+    def close(self):
+        self.flush()
+        self.writer.close()
+        os.replace(self.partial_path, self.path)
+
+
+class NestedWriter(object):
+    """
+    Buffer the rows of one nested table (see NESTED_TABLES) as typed
+    columns and write them to a Parquet file in row groups of batch_size
+    rows. Rows are appended as values in column order, so millions of
+    heartbeats cost no per-row dicts or strings.
+    """
+
+    def __init__(self, path, columns, batch_size=BATCH_SIZE):
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        self.path = path
+        self.schema = pa.schema(
+            [(name, getattr(pa, datatype)()) for name, datatype in columns]
+        )
+        self.batch_size = batch_size
+        self.writer = pq.ParquetWriter(path, self.schema)
+        self.reset()
+
+    def reset(self):
+        self.columns = [[] for _ in self.schema]
+        self.n_buffered = 0
+
+    def append(self, *values):
+        for column, value in zip(self.columns, values):
+            column.append(value)
+        self.n_buffered += 1
+        if self.n_buffered >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        import pyarrow as pa
+
+        if self.n_buffered == 0:
+            return
+        arrays = [
+            pa.array(values, type=field.type)
+            for (values, field) in zip(self.columns, self.schema)
+        ]
+        self.writer.write_table(pa.Table.from_arrays(arrays, schema=self.schema))
+        self.reset()
+
+    def close(self):
+        self.flush()
+        self.writer.close()
+
+
 class HealthDataExtractor(object):
     """
     Extract health data from Apple Health App's XML export, export.xml.
     Inputs:
-        path:      Relative or absolute path to export.xml
+        path:      Relative or absolute path to export.xml, or to the
+                   export.zip containing it
         verbose:   Set to False for less verbose output
+        streaming: Set to True to parse export.xml incrementally while
+                   extracting, instead of loading the whole tree first.
+                   Peak memory then stays flat regardless of export size.
+        types, start, end, sources:
+                   Optional filters, see RecordFilter. Only the matching
+                   nodes are written; the stats still cover everything.
+        output_format:
+                   "csv" (default) writes the rows as text, "parquet"
+                   writes typed columns, see ColumnarWriter.
+        max_open_files, buffer_size:
+                   CSV rows are buffered per type and written in blocks
+                   of about buffer_size characters through a pool of at
+                   most max_open_files handles, see HandlePool.
+        watermarks:
+                   Set to a dict (possibly empty) mapping types to the
+                   latest creationDate already extracted, as nanoseconds
+                   since the epoch, for incremental extraction. Records
+                   that are not newer are skipped, and self.watermarks
+                   is updated with the latest date written for each type.
+        append:    Append to existing outputs instead of replacing them.
+        naming:    Function mapping a type to its output file stem.
+        nested:    Also extract child elements into tables of their own,
+                   see NESTED_TABLES: the MetadataEntry key/value pairs of
+                   Records and Workouts, the InstantaneousBeatsPerMinute
+                   of heart rate variability Records, as bpm (int16) and
+                   time of day in milliseconds (int32), and the GPX file
+                   paths of WorkoutRoutes (see routes.py). Each top-level
+                   node gets a recordId, its position in export.xml,
+                   written as the first column of its own output and
+                   of its child rows. Nested tables are always Parquet,
+                   are written in the same pass, and cannot be appended
+                   to; with more than one worker they are parsed serially.
+        workers:   Number of processes to parse with. With more than one,
+                   export.xml is split into byte ranges at top-level
+                   element boundaries, each range is parsed in its own
+                   process, and the per-type outputs and stats are merged
+                   in file order, so the results match a serial run.
+                   Needs an uncompressed export.xml; an export.zip is
+                   parsed serially.
     Outputs:
         Writes a CSV file for each record type found, in the same
         directory as the input export.xml. Reports each file written
-        unless verbose has been set to False.
+        unless verbose has been set to False. Tag, field and type counts
+        are collected during the same pass, so report_stats() should be
+        called after extract().
     """
 
     def __init__(
@@ -123,22 +912,113 @@ class HealthDataExtractor(object):
         path,
         target_directory=None,
         vlogger: Union[VerbosityLogger, None] = None,
+        streaming: bool = False,
+        types=None,
+        start=None,
+        end=None,
+        sources=None,
+        workers: int = 1,
+        output_format: str = "csv",
+        max_open_files: int = MAX_OPEN_FILES,
+        buffer_size: int = WRITE_BUFFER_SIZE,
+        watermarks=None,
+        append: bool = False,
+        naming=abbreviate,
+        nested: bool = False,
     ):
+        if output_format not in OUTPUT_FORMATS:
+            raise ValueError("Unexpected output format: %s" % output_format)
+        if nested and append:
+            raise ValueError("Nested tables cannot be appended to")
         self.in_path = path
+        self.output_format = output_format
+        self.max_open_files = max_open_files
+        self.buffer_size = buffer_size
+        self.since = None if watermarks is None else dict(watermarks)
+        self.watermarks = None if watermarks is None else dict(watermarks)
+        self.append = append
+        self.naming = naming
+        self.nested = nested
+        self.tag_fields = FIELDS
+        if nested:
+            self.tag_fields = {
+                tag: OrderedDict([(RECORD_ID, "i")] + list(fields.items()))
+                for (tag, fields) in FIELDS.items()
+            }
+        self.node_id = 0
+        self.nested_writers = {}
+        self.streaming = streaming
+        self.workers = workers
+        self.filters = dict(types=types, start=start, end=end, sources=sources)
+        self.record_filter = RecordFilter(**self.filters)
         self.__vlogger = vlogger
         if target_directory is not None:
             self.directory = target_directory
         else:
             self.directory = os.path.abspath(os.path.split(path)[0])
-        with open(path) as f:
+        self.abbreviations = {}
+        self.handles = {}
+        self.pool = HandlePool(max_open_files, append)
+        self.reset_stats()
+        if append and self.since:
+            self.drop_missing_watermarks()
+            self.drop_watermark_days()
+        if streaming or workers > 1:
+            self.data = self.root = self.nodes = None
+            self.n_nodes = 0
+            return
+        with open_export_xml(path) as f:
             self.log("info", "Reading data from %s . . . " % path, 0)
             self.data = ElementTree.parse(f)
             self.log("info", "done", 0)
         self.root = self.data._root
         self.nodes = list(self.root)
         self.n_nodes = len(self.nodes)
-        self.abbreviate_types()
-        self.collect_stats()
+
+    def drop_missing_watermarks(self):
+        """
+        A watermark only holds for the output it was written to: types
+        whose output file (in this output_format) is missing, e.g. after
+        switching from CSV to Parquet, are extracted in full
+        """
+        for kind in list(self.since):
+            path = self.output_path(kind)
+            if not os.path.exists(path):
+                self.log("info", "No %s, extracting all %s records" % (path, kind), 1)
+                del self.since[kind]
+                del self.watermarks[kind]
+
+    def drop_watermark_days(self):
+        """
+        Remove the rows of the watermark day from the existing output of
+        DAY_WATERMARK_TAGS, which are then extracted again (see
+        process_node), so that they hold the values of the latest export
+        """
+        for tag in DAY_WATERMARK_TAGS:
+            since = self.since.get(tag)
+            path = self.output_path(tag)
+            if since is None or not os.path.exists(path):
+                continue
+            field = WATERMARK_FIELDS[tag][0]
+            partial_path = path + ".partial"
+            if self.output_format == "parquet":
+                import pyarrow.compute as pc
+                import pyarrow.parquet as pq
+
+                table = pq.read_table(path)
+                keep = pc.fill_null(pc.less(table.column(field), since), True)
+                pq.write_table(table.filter(keep), partial_path)
+            else:
+                with open(path) as source, open(partial_path, "w") as target:
+                    header = source.readline()
+                    index = header.rstrip("\n").split(",").index(field)
+                    target.write(header)
+                    for line in source:
+                        value = line.split(",", index + 1)[index].rstrip("\n")
+                        if not value or decode_date(value)[0] < since:
+                            target.write(line)
+            os.replace(partial_path, path)
+            self.log("info", "Extracting %s again from its watermark day" % tag, 1)
 
     @property
     def vlogger(self):
@@ -162,6 +1042,23 @@ class HealthDataExtractor(object):
         if self.vlogger is not None:
             self.vlogger.log(level, message, verbosity)
 
+    def iter_nodes(self):
+        """
+        Incrementally parse export.xml, yielding each top-level node
+        (Record, Workout, ActivitySummary, ...) once it has been read
+        completely, see iter_export_nodes().
+        """
+        self.log("info", "Streaming data from %s . . . " % self.in_path, 0)
+        for node in iter_export_nodes(self.in_path):
+            yield node
+        self.log("info", "done", 0)
+
+    def reset_stats(self):
+        self.tags = Counter()
+        self.fields = Counter()
+        self.record_types = Counter()
+        self.other_types = Counter()
+
     def count_tags_and_fields(self):
         self.tags = Counter()
         self.fields = Counter()
@@ -199,16 +1096,60 @@ class HealthDataExtractor(object):
         self.count_record_types()
         self.count_tags_and_fields()
 
-    def open_for_writing(self):
-        self.handles = {}
-        self.paths = []
-        for kind in list(self.record_types) + list(self.other_types):
-            path = os.path.join(self.directory, "%s.csv" % abbreviate(kind))
-            f = open(path, "w")
-            headerType = kind if kind in ("Workout", "ActivitySummary") else "Record"
-            f.write(",".join(FIELDS[headerType].keys()) + "\n")
-            self.handles[kind] = f
+    def output_path(self, kind, directory=None):
+        return os.path.join(
+            directory or self.directory,
+            "%s.%s" % (self.naming(kind), self.output_format),
+        )
+
+    def open_handle(self, kind):
+        path = self.output_path(kind)
+        headerType = kind if kind in ("Workout", "ActivitySummary") else "Record"
+        if self.output_format == "parquet":
+            f = ColumnarWriter(path, self.tag_fields[headerType], append=self.append)
+        else:
+            has_header = (
+                self.append and os.path.exists(path) and os.path.getsize(path) > 0
+            )
+            f = BufferedWriter(self.pool, path, self.buffer_size)
+            if not has_header:
+                f.write(",".join(self.tag_fields[headerType].keys()) + "\n")
+        self.handles[kind] = f
+        self.paths.append(path)
+        self.log("debug", "Opening %s for writing" % path, 1)
+        return f
+
+    def nested_writer(self, name):
+        f = self.nested_writers.get(name)
+        if f is None:
+            path = os.path.join(self.directory, "%s.parquet" % self.naming(name))
+            f = self.nested_writers[name] = NestedWriter(path, NESTED_TABLES[name])
             self.log("debug", "Opening %s for writing" % path, 1)
+        return f
+
+    def write_nested(self, node, record_id):
+        """
+        Write the MetadataEntry, heartbeat and route file children of a
+        node to the nested tables.
+        """
+        for child in node:
+            if child.tag == "MetadataEntry":
+                self.nested_writer("MetadataEntry").append(
+                    record_id, child.get("key"), child.get("value")
+                )
+            elif child.tag == "HeartRateVariabilityMetadataList":
+                beats = self.nested_writer("InstantaneousBeatsPerMinute")
+                for beat in child:
+                    beats.append(
+                        record_id,
+                        parse_int(beat.get("bpm")),
+                        time_of_day_ms(beat.get("time")),
+                    )
+            elif child.tag == "WorkoutRoute":
+                for reference in child.iter("FileReference"):
+                    self.nested_writer("WorkoutRoute").append(
+                        record_id, reference.get("path")
+                    )
 
     def abbreviate_types(self):
         """
@@ -219,27 +1160,181 @@ class HealthDataExtractor(object):
                 if "type" in node.attrib:
                     node.attrib["type"] = abbreviate(node.attrib["type"])
 
-    def write_records(self):
-        kinds = FIELDS.keys()
-        for node in self.nodes:
-            if node.tag in kinds:
-                attributes = node.attrib
-                kind = attributes["type"] if node.tag == "Record" else node.tag
-                values = [
-                    format_value(attributes.get(field), datatype)
-                    for (field, datatype) in FIELDS[node.tag].items()
-                ]
-                line = ",".join(values) + "\n"
-                self.handles[kind].write(line)
+    def abbreviate_type(self, kind):
+        """
+        Memoized abbreviate(); an export only has a few hundred distinct
+        types but millions of records.
+        """
+        short = self.abbreviations.get(kind)
+        if short is None:
+            short = self.abbreviations[kind] = abbreviate(kind)
+        return short
+
+    def watermark_date(self, tag, attributes):
+        for field in WATERMARK_FIELDS[tag]:
+            value = attributes.get(field)
+            if value is not None:
+                return decode_date(value)[0]
+        return None
+
+    def process_node(self, node):
+        """
+        Abbreviate, count and write a single top-level node. This is the
+        whole per-node work of extract(), so the export is only traversed
+        once.
+        """
+        tag = node.tag
+        attributes = node.attrib
+        record_id = self.node_id
+        self.node_id += 1
+        self.tags[tag] += 1
+        for k in attributes.keys():
+            self.fields[k] += 1
+        if tag == "Record":
+            if "type" in attributes:
+                attributes["type"] = self.abbreviate_type(attributes["type"])
+            kind = attributes["type"]
+            self.record_types[kind] += 1
+        elif tag in ("ActivitySummary", "Workout"):
+            kind = tag
+            self.other_types[kind] += 1
+        else:
+            if tag not in ("Export", "Me"):
+                self.log("warning", "Unexpected node of type %s." % tag, 1)
+            return
+        if self.record_filter.active and not self.record_filter.accepts(
+            tag, attributes
+        ):
+            return
+        if self.watermarks is not None:
+            when = self.watermark_date(tag, attributes)
+            if when is not None:
+                since = self.since.get(kind)
+                if since is not None and (
+                    when < since if tag in DAY_WATERMARK_TAGS else when <= since
+                ):
+                    return
+                if kind not in self.watermarks or when > self.watermarks[kind]:
+                    self.watermarks[kind] = when
+        if self.nested:
+            attributes[RECORD_ID] = record_id
+            if len(node):
+                self.write_nested(node, record_id)
+        f = self.handles.get(kind)
+        if f is None:
+            f = self.open_handle(kind)
+        if self.output_format == "parquet":
+            f.append(attributes)
+            return
+        values = [
+            format_value(attributes.get(field), datatype)
+            for (field, datatype) in self.tag_fields[tag].items()
+        ]
+        f.write(",".join(values) + "\n")
+
+    def write_records(self, nodes):
+        """
+        Single pass over nodes (the loaded tree, or iter_nodes() when
+        streaming); outputs are opened the first time each type appears.
+        """
+        self.handles = {}
+        self.paths = []
+        self.pool = HandlePool(self.max_open_files, self.append)
+        self.reset_stats()
+        self.node_id = 0
+        n_nodes = 0
+        for node in nodes:
+            n_nodes += 1
+            self.process_node(node)
+        self.n_nodes = n_nodes
 
     def close_files(self):
         for kind, f in self.handles.items():
             f.close()
             self.log("debug", "Written %s data." % abbreviate(kind), 1)
+        self.pool.close()
+        for name, f in self.nested_writers.items():
+            f.close()
+            self.log("debug", "Written %s data." % name, 1)
+        self.nested_writers = {}
+
+    def extract_parallel(self):
+        """
+        Parse byte ranges of export.xml in worker processes, then
+        concatenate each type's parts in file order and add up the stats.
+        """
+        chunks = find_chunk_boundaries(self.in_path, self.workers)
+        self.log(
+            "info",
+            "Parsing %s in %d chunks with %d workers . . . "
+            % (self.in_path, len(chunks), self.workers),
+            0,
+        )
+        parts_directory = tempfile.mkdtemp(prefix=".parts-", dir=self.directory)
+        try:
+            part_directories = []
+            for i in range(len(chunks)):
+                part_directories.append(os.path.join(parts_directory, str(i)))
+                os.mkdir(part_directories[-1])
+            with ProcessPoolExecutor(max_workers=self.workers) as executor:
+                results = list(
+                    executor.map(
+                        extract_chunk,
+                        [self.in_path] * len(chunks),
+                        [start for (start, end) in chunks],
+                        [end for (start, end) in chunks],
+                        part_directories,
+                        [self.filters] * len(chunks),
+                        [self.output_format] * len(chunks),
+                        [self.since] * len(chunks),
+                    )
+                )
+
+            self.handles = {}
+            self.paths = []
+            self.pool = HandlePool(self.max_open_files, self.append)
+            self.reset_stats()
+            self.n_nodes = 0
+            parts = OrderedDict()
+            for part_directory, result in zip(part_directories, results):
+                self.n_nodes += result["n_nodes"]
+                self.tags.update(result["tags"])
+                self.fields.update(result["fields"])
+                self.record_types.update(result["record_types"])
+                self.other_types.update(result["other_types"])
+                for kind, when in (result["watermarks"] or {}).items():
+                    if kind not in self.watermarks or when > self.watermarks[kind]:
+                        self.watermarks[kind] = when
+                for kind in result["kinds"]:
+                    path = os.path.join(
+                        part_directory, "%s.%s" % (abbreviate(kind), self.output_format)
+                    )
+                    parts.setdefault(kind, []).append(path)
+            for kind, paths in parts.items():
+                f = self.open_handle(kind)
+                if self.output_format == "parquet":
+                    f.write_parts(paths)
+                    continue
+                for path in paths:
+                    with open(path) as source:
+                        source.readline()  # header
+                        shutil.copyfileobj(source, f, BLOCK_SIZE)
+        finally:
+            shutil.rmtree(parts_directory, ignore_errors=True)
+        self.log("info", "done", 0)
 
     def extract(self):
-        self.open_for_writing()
-        self.write_records()
+        parallel = self.workers > 1
+        if parallel and self.nested:
+            self.log("warning", "Extracting nested tables serially", 0)
+            parallel = False
+        elif parallel and zipfile.is_zipfile(self.in_path):
+            self.log("warning", "Cannot split a zip file, parsing serially", 0)
+            parallel = False
+        if parallel:
+            self.extract_parallel()
+        else:
+            self.write_records(self.iter_nodes() if self.nodes is None else self.nodes)
         self.close_files()
 
     def report_stats(self):
@@ -0,0 +1,196 @@
+"""
+Extract the workout routes in Apple Health App's export.zip.
+
+Each Workout with a route has a WorkoutRoute child whose FileReference
+points at a GPX file in the workout-routes folder of the export, e.g.
+/workout-routes/route_2023-05-01_8.00am.gpx. The GPX members are parsed
+straight from the zip, in parallel, into a single Parquet store with one
+row per trackpoint, see ROUTE_SCHEMA.
+"""
+import os
+import zipfile
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from concurrent.futures import ProcessPoolExecutor
+from xml.etree import ElementTree
+
+from typing import Dict, List, Optional, Tuple, Union
+from apple_health_data.core.logger import VerbosityLogger
+
+
+ROUTES_FOLDER = "workout-routes"
+
+# route is the FileReference path of the WorkoutRoute, so the store joins
+# with the WorkoutRoute nested table (and through its recordId, with the
+# Workout rows) written by HealthDataExtractor(nested=True)
+ROUTE_SCHEMA = pa.schema(
+    [
+        ("route", pa.dictionary(pa.int32(), pa.string())),
+        ("lat", pa.float64()),
+        ("lon", pa.float64()),
+        ("elevation", pa.float32()),
+        ("time", pa.timestamp("ns", tz="UTC")),
+        ("speed", pa.float32()),
+    ]
+)
+
+BATCHES_PER_WORKER = 8
+
+
+def find_route_members(zip_file: zipfile.ZipFile) -> List[str]:
+    "GPX members of the workout-routes folder of an export.zip, in zip order"
+    return [
+        name
+        for name in zip_file.namelist()
+        if name.lower().endswith(".gpx")
+        and f"/{ROUTES_FOLDER}/" in f"/{name}"
+    ]
+
+
+def route_reference(member: str) -> str:
+    """
+    FileReference path of a GPX member, e.g.
+    apple_health_export/workout-routes/route.gpx -> /workout-routes/route.gpx
+    """
+    return "/" + member[f"/{member}".index(f"/{ROUTES_FOLDER}/") :]
+
+
+def parse_gpx(f) -> Dict[str, np.ndarray]:
+    """
+    Read the trackpoints of a GPX file into typed arrays: lat and lon
+    (float64), elevation and speed (float32, NaN if missing or empty) and
+    time (naive datetime64[ns] in UTC, NaT if missing or empty, e.g.
+    <time/>). Route files are small, so the whole document is parsed at
+    once, which is cheaper than handling an iterparse event for every
+    element.
+    """
+    root = ElementTree.parse(f).getroot()
+    ns = root.tag[: root.tag.index("}") + 1] if root.tag.startswith("{") else ""
+    ele_tag, time_tag, extensions_tag = ns + "ele", ns + "time", ns + "extensions"
+
+    lats, lons, elevations, times, speeds = [], [], [], [], []
+    for trkpt in root.iter(ns + "trkpt"):
+        lats.append(trkpt.get("lat"))
+        lons.append(trkpt.get("lon"))
+        elevation, time, speed = "nan", "NaT", "nan"
+        for child in trkpt:
+            if child.tag == ele_tag:
+                elevation = (child.text or "").strip() or "nan"
+            elif child.tag == time_tag:
+                time = (child.text or "").strip().rstrip("Zz") or "NaT"
+            elif child.tag == extensions_tag:
+                for extension in child:
+                    if extension.tag.rpartition("}")[2] == "speed":
+                        speed = (extension.text or "").strip() or "nan"
+        elevations.append(elevation)
+        times.append(time)
+        speeds.append(speed)
+
+    return {
+        "lat": np.array(lats, dtype=np.float64),
+        "lon": np.array(lons, dtype=np.float64),
+        "elevation": np.array(elevations, dtype=np.float64).astype(np.float32),
+        "time": np.array(times, dtype="datetime64[ns]"),
+        "speed": np.array(speeds, dtype=np.float64).astype(np.float32),
+    }
+
+
+def read_routes(
+    export_zip: Union[str, os.PathLike], members: List[str]
+) -> Tuple[Optional[pa.Table], int, List[Tuple[str, str]]]:
+    """
+    Worker for extract_routes: parse a batch of GPX members, opening the
+    zip once per batch. Returns a table of all their trackpoints (None if
+    there are none), the number of routes in it, and (route, error) for
+    each member that could not be parsed.
+    """
+    tables = []
+    failed = []
+    with zipfile.ZipFile(export_zip, "r") as zip_file:
+        for member in members:
+            route = route_reference(member)
+            try:
+                with zip_file.open(member) as f:
+                    columns = parse_gpx(f)
+            except (ElementTree.ParseError, ValueError, TypeError) as e:
+                failed.append((route, str(e)))
+                continue
+            n_points = len(columns["lat"])
+            arrays = [
+                pa.DictionaryArray.from_arrays(
+                    pa.array(np.zeros(n_points, dtype=np.int32)), pa.array([route])
+                ),
+                pa.array(columns["lat"]),
+                pa.array(columns["lon"]),
+                pa.array(columns["elevation"], from_pandas=True),
+                pa.array(
+                    columns["time"],
+                    type=ROUTE_SCHEMA.field("time").type,
+                    from_pandas=True,
+                ),
+                pa.array(columns["speed"], from_pandas=True),
+            ]
+            tables.append(pa.Table.from_arrays(arrays, schema=ROUTE_SCHEMA))
+
+    if not tables:
+        return None, 0, failed
+    table = pa.concat_tables(tables).unify_dictionaries().combine_chunks()
+    return table, len(tables), failed
+
+
+def batch_members(members: List[str], workers: int) -> List[List[str]]:
+    "Contiguous batches of members, a few per worker so the load evens out"
+    n_batches = max(1, min(len(members), workers * BATCHES_PER_WORKER))
+    size = -(-len(members) // n_batches)
+    return [members[i : i + size] for i in range(0, len(members), size)]
+
+
+def extract_routes(
+    export_zip: Union[str, os.PathLike],
+    target_file: Union[str, os.PathLike],
+    workers: Optional[int] = None,
+    vlogger: Union[VerbosityLogger, None] = None,
+) -> Dict[str, int]:
+    """
+    Parse every workout-routes/*.gpx member of export_zip into the Parquet
+    file target_file, one row group per batch, in zip order. Batches of
+    members are parsed in a pool of workers processes (all CPUs by
+    default); with workers=1 they are parsed in this process. Nothing is
+    written if the export has no routes. Returns the number of routes
+    written, points written and members that could not be parsed.
+    """
+    workers = workers or os.cpu_count() or 1
+    with zipfile.ZipFile(export_zip, "r") as zip_file:
+        members = find_route_members(zip_file)
+    stats = {"routes": 0, "points": 0, "failed": 0}
+    if not members:
+        return stats
+
+    batches = batch_members(members, workers)
+    if workers > 1:
+        executor = ProcessPoolExecutor(max_workers=workers)
+        results = executor.map(read_routes, [export_zip] * len(batches), batches)
+    else:
+        executor = None
+        results = (read_routes(export_zip, batch) for batch in batches)
+
+    try:
+        with pq.ParquetWriter(str(target_file), ROUTE_SCHEMA) as writer:
+            for table, n_routes, failed in results:
+                for route, error in failed:
+                    if vlogger is not None:
+                        vlogger.warning(f"Skipping route {route}: {error}", 1)
+                stats["failed"] += len(failed)
+                if table is None:
+                    continue
+                writer.write_table(table)
+                stats["routes"] += n_routes
+                stats["points"] += table.num_rows
+    finally:
+        if executor is not None:
+            executor.shutdown()
+
+    return stats
@@ -0,0 +1,153 @@
+"""
+Store wrangled data frames as fixed-width column files that can be
+memory-mapped.
+
+A store is a directory (named <name>.series) holding
+    header.json: the number of rows, a digest of the frame's contents
+                 (see frame_digest) and how each column is encoded
+    <i>.<dtype>: the values of the i-th column, back to back, as raw
+                 little-endian numbers
+Datetimes are int64 nanoseconds (in UTC for tz-aware columns, whose fixed
+offset is kept in the header), categories and strings are int32 codes
+into categories listed in the header, and numbers and booleans are kept
+as they are. read_series maps each column file with np.memmap, so pages
+are only read when they are used, and processes reading the same store
+share one copy of it in the OS page cache.
+"""
+import datetime
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+from pathlib import Path
+
+from typing import Any, Dict, Tuple, Union
+from apple_health_data.utils import frame_digest
+
+SERIES_SUFFIX = ".series"
+HEADER_FILENAME = "header.json"
+CODES_DTYPE = np.dtype("<i4")
+EPOCH_DTYPE = np.dtype("<i8")
+
+
+def encode_column(column: pd.Series) -> Tuple[np.ndarray, Dict[str, Any]]:
+    "Fixed-width values of a column and how to decode them (see decode_column)"
+    dtype = column.dtype
+    if pd.api.types.is_datetime64_any_dtype(dtype):
+        index = pd.DatetimeIndex(column).as_unit("ns")
+        tz_minutes = None
+        if index.tz is not None:
+            offset = index.tz.utcoffset(None)
+            if offset is None:
+                raise ValueError(
+                    f"Cannot store {column.name}, {index.tz} is not a fixed offset"
+                )
+            tz_minutes = int(offset.total_seconds()) // 60
+        return index.asi8.astype(EPOCH_DTYPE, copy=False), {
+            "kind": "datetime",
+            "tz_minutes": tz_minutes,
+        }
+    if isinstance(dtype, pd.CategoricalDtype):
+        return column.cat.codes.to_numpy().astype(CODES_DTYPE), {
+            "kind": "category",
+            "categories": column.cat.categories.tolist(),
+            "ordered": bool(dtype.ordered),
+        }
+    if dtype == object or pd.api.types.is_string_dtype(dtype):
+        codes, uniques = pd.factorize(column)
+        return codes.astype(CODES_DTYPE), {
+            "kind": "object",
+            "categories": uniques.tolist(),
+        }
+    if isinstance(dtype, np.dtype) and dtype.kind in "biuf":
+        values = column.to_numpy()
+        return values.astype(dtype.newbyteorder("<"), copy=False), {"kind": "number"}
+    raise ValueError(f"Cannot store {column.name} of dtype {dtype}")
+
+
+def decode_column(values: np.ndarray, encoding: Dict[str, Any]) -> Any:
+    "Column of a data frame from its values and encoding (see encode_column)"
+    kind = encoding["kind"]
+    if kind == "datetime":
+        index = pd.DatetimeIndex(values.view("M8[ns]"))
+        if encoding["tz_minutes"] is None:
+            return index
+        tz = datetime.timezone(datetime.timedelta(minutes=encoding["tz_minutes"]))
+        return index.tz_localize("UTC").tz_convert(tz)
+    if kind == "category":
+        return pd.Categorical.from_codes(
+            values, categories=encoding["categories"], ordered=encoding["ordered"]
+        )
+    if kind == "object":
+        return pd.Categorical.from_codes(
+            values, categories=encoding["categories"]
+        ).astype(object)
+    return values
+
+
+def write_series(
+    df: pd.DataFrame, store_directory: Union[str, os.PathLike]
+) -> Path:
+    """
+    Write the columns of df (not its index) into the store in
+    store_directory, see the module docstring. The header is written last,
+    so an interrupted write leaves no readable store. Raises ValueError
+    for columns that cannot be stored, e.g. with a pytz timezone.
+    """
+    store_directory = Path(store_directory)
+    store_directory.mkdir(parents=True, exist_ok=True)
+    header_file = store_directory / HEADER_FILENAME
+    if header_file.exists():
+        header_file.unlink()
+
+    columns = []
+    for i, name in enumerate(df.columns):
+        values, encoding = encode_column(df[name])
+        encoding["name"] = name
+        encoding["dtype"] = values.dtype.str
+        encoding["file"] = f"{i}.{values.dtype.str.strip('<>|=')}"
+        values.tofile(store_directory / encoding["file"])
+        columns.append(encoding)
+
+    header = {"rows": len(df), "digest": frame_digest(df), "columns": columns}
+    with open(header_file, "w") as file:
+        json.dump(header, file, default=str, indent=4)
+
+    return store_directory
+
+
+def read_series_header(store_directory: Union[str, os.PathLike]) -> Dict[str, Any]:
+    "Header of a store, see write_series"
+    with open(Path(store_directory) / HEADER_FILENAME, "r") as file:
+        return json.load(file)
+
+
+def series_digest(store_directory: Union[str, os.PathLike]) -> str:
+    "Digest of the contents of the frame in a store, without reading it"
+    return read_series_header(store_directory)["digest"]
+
+
+def read_series(store_directory: Union[str, os.PathLike]) -> pd.DataFrame:
+    """
+    Data frame of a store written by write_series. Numbers are read-only
+    memory maps of their column files; datetimes, categories and strings
+    are decoded from memory-mapped values.
+    """
+    store_directory = Path(store_directory)
+    header = read_series_header(store_directory)
+    rows = header["rows"]
+
+    data = {}
+    for encoding in header["columns"]:
+        dtype = np.dtype(encoding["dtype"])
+        if rows == 0:
+            values = np.empty(0, dtype=dtype)
+        else:
+            values = np.memmap(
+                store_directory / encoding["file"], dtype=dtype, mode="r", shape=(rows,)
+            )
+        data[encoding["name"]] = decode_column(values, encoding)
+
+    return pd.DataFrame(data, copy=False)
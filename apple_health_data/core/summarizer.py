@@ -1,5 +1,9 @@
+import re
 from typing import Dict, Any, List, Optional, Union
+import numpy as np
 import pandas as pd
+import pyarrow as pa
+import pyarrow.csv as pa_csv
 from inflection import underscore
 from unidecode import unidecode
 from pathlib import Path
@@ -7,8 +11,47 @@ from pydantic import BaseModel, ConfigDict, Field, computed_field, root_validato
 from pint import UnitRegistry
 from functools import cached_property, lru_cache
 
+from apple_health_data.core.aggregation import summarize_sweep_bins, summarize_time_bins
+from apple_health_data.core.cache import SummaryCache
 from apple_health_data.core.logger import VerbosityLoggerConfig
-from apple_health_data.utils import hash_model, DataFrameModel, get_df_dtypes
+from apple_health_data.core.parser import FIELDS, OFFSET_SUFFIX, RECORD_ID
+from apple_health_data.core.series import SERIES_SUFFIX, read_series, series_digest
+from apple_health_data.utils import (
+    file_digest,
+    fingerprint,
+    fingerprint_hash,
+    DataFrameModel,
+    get_df_dtypes,
+    decode_epoch_columns,
+    decode_arrow_dates,
+    epoch_to_datetime,
+    map_values,
+    is_sorted_by,
+)
+
+# Datatype of every column the parser writes, see parser.FIELDS
+PARSED_FIELDS = {RECORD_ID: "i"}
+for fields in FIELDS.values():
+    PARSED_FIELDS.update(fields)
+
+
+def arrow_csv_type(col_type: str) -> Optional[pa.DataType]:
+    "Arrow type to read a column cast to col_type as, or None to infer it"
+    if col_type == "category":
+        return pa.dictionary(pa.int32(), pa.string())
+    if col_type == "object" or col_type.startswith("datetime64"):
+        return pa.string()
+    try:
+        return pa.from_numpy_dtype(np.dtype(col_type))
+    except TypeError:
+        return None
+
+
+def remove_special_characters(values: pd.Index) -> pd.Index:
+    "Strip non-ASCII characters from the strings in values"
+    return values.map(
+        lambda x: re.sub(r"[^\x00-\x7F]+", "", x) if isinstance(x, str) else x
+    )
 
 
 def set_private_fields(cls, public_fields: List[str], values: Dict[str, Any]) -> None:
@@ -27,7 +70,7 @@ class DataWrangler(BaseModel):
     filter_sources: Optional[List[str]] = Field(default=None)
     col_types: Optional[dict] = Field(
         default={
-            "object": ["sourceName", "sourceVersion", "device", "type", "unit"],
+            "category": ["sourceName", "sourceVersion", "device", "type", "unit"],
             "float64": ["value"],
             "datetime64[ns]": ["creationDate", "startDate", "endDate"],
         }
@@ -47,27 +90,39 @@ class DataWrangler(BaseModel):
     def __init__(self, **data):
         super().__init__(**data)
 
-        if self.file_path is not None:
-            object.__setattr__(self, "parsed_data", self.read_csv())
+        # A loaded artifact already holds the data read from file_path
+        if self.file_path is not None and self.parsed_data is None:
+            object.__setattr__(self, "parsed_data", self.read_file())
 
         if self.parsed_data is not None:
+            parsed_data = self.parsed_data
+            if isinstance(parsed_data, dict) and "dataframe" in parsed_data:
+                # Dump of the DataFrameModel, from JSON or read_artifact
+                parsed_data = parsed_data["dataframe"]
             object.__setattr__(
                 self,
                 "parsed_data",
-                DataFrameModel(dataframe=self.parsed_data, dtypes=self.col_types),
+                DataFrameModel(dataframe=parsed_data, dtypes=self.col_types),
             )
 
+        if data.get("fingerprint") is not None:
+            # Dumped along with the data, see fingerprint
+            self._fingerprint = data["fingerprint"]
+        else:
+            if self.file_path is not None and Path(self.file_path).suffix == SERIES_SUFFIX:
+                source = series_digest(self.file_path)
+            elif self.file_path is not None:
+                source = file_digest(self.file_path)
+            elif self.parsed_data is not None:
+                source = self.parsed_data.fingerprint
+            else:
+                source = None
+            self._fingerprint = fingerprint(source, self.filter_sources, self.col_types)
+
         self.preprocess.cache_clear()
 
     def __hash__(self):
-        return hash_model(
-            (
-                self.parsed_data,
-                self.file_path,
-                self.filter_sources,
-                self.col_types,
-            )
-        )
+        return fingerprint_hash(self.fingerprint)
 
     @property
     def vlogger(self):
@@ -103,12 +158,119 @@ class DataWrangler(BaseModel):
 
         return self._units
 
+    @computed_field
+    @property
+    def fingerprint(self) -> str:
+        """
+        Digest of the data and of the settings the preprocessed data depends
+        on, computed once at construction. Unlike hash() it is stable across
+        processes and runs, so it can address persisted results (see
+        SummaryCache). Data read from file_path is identified by the file's
+        size and contents, which is cheaper than digesting the frame. It is
+        dumped with the model, so a loaded artifact keeps it without
+        reading file_path again.
+        """
+        return self._fingerprint
+
+    def read_file(self) -> pd.DataFrame:
+        if Path(self.file_path).suffix == ".parquet":
+            return self.read_parquet()
+        if Path(self.file_path).suffix == SERIES_SUFFIX:
+            return self.read_series()
+        return self.read_csv()
+
+    def read_series(self) -> pd.DataFrame:
+        """
+        Memory-map a store written by write_series, e.g. by wrangling with
+        the series artifact format, instead of reading it
+        """
+        self.vlogger.info(f"Memory-mapping input store {self.file_path}", 0)
+        return read_series(self.file_path)
+
+    def read_parquet(self) -> pd.DataFrame:
+        "Read the parser's Parquet output, whose columns are already typed"
+        self.vlogger.info(f"[START] Read input file {self.file_path}", 0)
+
+        try:
+            data = decode_epoch_columns(pd.read_parquet(self.file_path))
+        except FileNotFoundError as e:
+            self.vlogger.error(str(e), 0)
+            raise e
+        except Exception as e:
+            self.vlogger.error("Failed to read the Parquet file", 0)
+            self.vlogger.error(str(e), 0)
+            raise e
+        else:
+            self.vlogger.info(f"[END] Read input file {self.file_path}", 0)
+
+        return data
+
+    def read_parsed_csv(self) -> Optional[pd.DataFrame]:
+        """
+        Fast path for the parser's CSV output, whose columns are known (see
+        PARSED_FIELDS): only the columns in col_types are read, straight
+        into their types, by pyarrow's multithreaded reader, which also
+        handles the parser's backslash escapes. Categories are
+        dictionary-encoded as they are read, and dates are decoded from the
+        fixed DATE_FORMAT of export.xml along with <col>Offset columns.
+        Returns None for other files, or if a column cannot be read as its
+        type, so that they are read the slow way.
+        """
+        with open(str(self.file_path), "r") as file:
+            header = file.readline().rstrip("\r\n").split(",")
+        if not header or any(col not in PARSED_FIELDS for col in header):
+            return None
+
+        col_types = {
+            col: col_type
+            for col_type, cols in (self.col_types or {}).items()
+            for col in cols
+        }
+        columns = [col for col in header if not col_types or col in col_types]
+        column_types = {
+            col: arrow_csv_type(col_types[col])
+            for col in columns
+            if col in col_types and arrow_csv_type(col_types[col]) is not None
+        }
+        date_columns = [
+            col for col in columns if col_types.get(col, "").startswith("datetime64")
+        ]
+
+        try:
+            table = pa_csv.read_csv(
+                str(self.file_path),
+                read_options=pa_csv.ReadOptions(use_threads=True),
+                parse_options=pa_csv.ParseOptions(escape_char="\\", double_quote=False),
+                convert_options=pa_csv.ConvertOptions(
+                    include_columns=columns,
+                    column_types=column_types,
+                    strings_can_be_null=True,
+                ),
+            )
+        except pa.ArrowInvalid as e:
+            self.vlogger.debug(f"Falling back to pandas to read the CSV file: {e}", 1)
+            return None
+
+        data = table.drop_columns(date_columns).to_pandas()
+        for col in date_columns:
+            decoded = decode_arrow_dates(table.column(col))
+            if decoded is None:
+                data[col] = table.column(col).to_pandas()
+                continue
+            epoch, offsets = decoded
+            data[col] = epoch_to_datetime(epoch, offsets)
+            data[f"{col}{OFFSET_SUFFIX}"] = offsets
+
+        return data[columns + [col for col in data.columns if col not in columns]]
+
     def read_csv(self) -> pd.DataFrame:
         self.vlogger.info(f"[START] Read input file {self.file_path}", 0)
 
         try:
-            with open(str(self.file_path), "r") as file:
-                data = pd.read_csv(file, header=0, low_memory=False)
+            data = self.read_parsed_csv()
+            if data is None:
+                with open(str(self.file_path), "r") as file:
+                    data = pd.read_csv(file, header=0, low_memory=False)
         except FileNotFoundError as e:
             self.vlogger.error(str(e), 0)
             raise e
@@ -122,8 +284,12 @@ class DataWrangler(BaseModel):
         return data
 
     @computed_field
-    @property
+    @cached_property
     def preprocessed_data(self) -> Union[DataFrameModel, None]:
+        """
+        Built and typecast once per instance; its dataframe is shared by
+        every caller, so it must not be modified in place
+        """
         if self._preprocessed_data is None and self.parsed_data is not None:
             self._preprocessed_data = {
                 "dataframe": self.preprocess(),
@@ -140,18 +306,30 @@ class DataWrangler(BaseModel):
         parsed_df = self.parsed_data.dataframe
         self.vlogger.info("[START] Preprocess data", 1)
 
-        processed_data = parsed_df.copy().sort_values(by=["startDate", "endDate"])
+        # Shallow copy: columns are replaced below, never written in place,
+        # so the parsed data is left untouched without copying every column
+        processed_data = parsed_df.copy(deep=False)
 
         self.vlogger.debug(
             "Removing special characters from the 'sourceName' column", 1
         )
-        processed_data["sourceName"] = processed_data["sourceName"].replace(
-            {r"[^\x00-\x7F]+": ""}, regex=True
+        processed_data["sourceName"] = map_values(
+            processed_data["sourceName"], remove_special_characters
         )
 
         if self.filter_sources is not None:
             self.vlogger.debug(f"Filter {self.filter_sources} sources.", 1)
-            processed_data = processed_data.query("sourceName in @filter_sources")
+            keep = processed_data["sourceName"].isin(self.filter_sources).to_numpy()
+            if not keep.all():
+                processed_data = processed_data[keep]
+
+        # Filtering first leaves fewer rows to sort, the sort is stable so
+        # the order is the same either way
+        sort_columns = ["startDate", "endDate"]
+        if not is_sorted_by(processed_data, sort_columns):
+            processed_data = processed_data.sort_values(
+                by=sort_columns, kind="stable"
+            )
 
         self.vlogger.info("[END] Preprocess data", 1)
 
@@ -254,6 +432,10 @@ class TypeSummary(BaseModel):
     agg_sources: Optional[str] = Field(default="mean")
     units: Optional[str] = Field(default=None)
     type: Optional[str] = Field(default=None)
+    # "numpy" (see aggregation.summarize_time_bins), "pandas", or "auto" to
+    # use numpy when it supports the interval and data, pandas otherwise
+    engine: Optional[str] = Field(default="auto")
+    summary_cache: Optional[SummaryCache] = Field(default=None, exclude=True)
     vlogger_config: VerbosityLoggerConfig = Field(default=VerbosityLoggerConfig())
 
     model_config = ConfigDict(arbitrary_types_allowed=True, frozen=True, extra="allow")
@@ -286,26 +468,45 @@ class TypeSummary(BaseModel):
         if self._normalizer.normalization is not None:
             object.__setattr__(self, "normalization", self._normalizer.normalization)
 
+        # Summary rolled up by summarize_sweep, if any
+        self._swept = None
+
+        self._fingerprint = fingerprint(
+            self.wrangled_data and self.wrangled_data.fingerprint,
+            {
+                "measures": self.measures,
+                "interval": self.interval,
+                "ffill": self.ffill,
+                "normalization": self.normalization,
+                "target_config": self.target_config,
+                "agg_sources": self.agg_sources,
+                "units": self.units,
+            },
+        )
+
         self.summarize.cache_clear()
 
     def __hash__(self):
-        return hash_model(
-            (
-                self.wrangled_data,
-                self.measures,
-                self.interval,
-                self.ffill,
-                self.normalization,
-                self.target_config,
-                self.agg_sources,
-                self.units,
-            )
-        )
+        return fingerprint_hash(self.fingerprint)
 
     @property
     def vlogger(self):
         return self.vlogger_config.vlogger
 
+    @property
+    def fingerprint(self) -> str:
+        """
+        Digest of the wrangled data's fingerprint and of the settings the
+        summary depends on, computed once at construction
+        """
+        return self._fingerprint
+
+    def cache_key(self) -> Union[str, None]:
+        "Address of the summary in summary_cache, None without a cache"
+        if self.summary_cache is None or self.wrangled_data is None:
+            return None
+        return self.fingerprint
+
     @cached_property
     def normalizer(self) -> TypeSummaryNormalizer:
         return self._normalizer
@@ -321,8 +522,9 @@ class TypeSummary(BaseModel):
         return self._sources
 
     @computed_field
-    @property
+    @cached_property
     def summary(self) -> Union[DataFrameModel, None]:
+        "Built and typecast once per instance, like DataWrangler.preprocessed_data"
         if self._summary is None and self.wrangled_data is not None:
             df = self.summarize()
             return DataFrameModel(dataframe=df, dtypes=get_df_dtypes(df))
@@ -333,40 +535,42 @@ class TypeSummary(BaseModel):
 
     @lru_cache(maxsize=128)
     def summarize(self) -> pd.DataFrame:
-        preprocessed_data = self.wrangled_data.preprocessed_data.dataframe
+        key = self.cache_key()
+        if key is not None:
+            cached = self.summary_cache.get(key)
+            if cached is not None:
+                self.vlogger.info("Statistical summary read from summary cache", 0)
+                return cached
+
+        if self._swept is None:
+            preprocessed_data = self.wrangled_data.preprocessed_data.dataframe
 
         self.vlogger.info("[START] Calculate statistical summary", 0)
         try:
-            self.vlogger.debug("Setting 'startDate' as index", 1)
-            preprocessed_data.set_index("startDate", inplace=True)
-
-            self.vlogger.debug(
-                "Grouping, resampling, and applying aggregation functions", 2
-            )
-            result = (
-                preprocessed_data.groupby("sourceName")["value"]
-                .resample(self.interval)
-                .apply(self.agg_sources)
-                .reset_index()[["startDate", "value"]]
-            )
-
-            if self.ffill:
-                self.vlogger.debug(
-                    "Filling NaN values after resampling using forward fill", 2
+            result = None
+            if self._swept is not None:
+                self.vlogger.debug("Using summary rolled up from the sweep", 1)
+                result = self._swept
+            elif self.engine in ("auto", "numpy"):
+                self.vlogger.debug("Aggregating time bins with numpy", 1)
+                result = summarize_time_bins(
+                    preprocessed_data,
+                    self.interval,
+                    self.agg_sources,
+                    self.measures,
+                    ffill=self.ffill,
                 )
-                result["value"].fillna(method="ffill", inplace=True)
-
-            self.vlogger.debug(
-                "Calculating desired summary measures for each resampled interval",
-                1,
-            )
-            result = result.groupby(["startDate"]).agg(self.measures)
-
-            self.vlogger.debug("Resetting index and flattening multi-index", 2)
-            result.reset_index(inplace=True)
-            result.columns = result.columns.map(
-                lambda x: x[1] if x[1] != "" else underscore(x[0])
-            )
+                if result is None and self.engine == "numpy":
+                    raise ValueError(
+                        f"numpy engine does not support interval {self.interval}, "
+                        f"agg_sources {self.agg_sources} or measures {self.measures}"
+                        " for this data"
+                    )
+            elif self.engine != "pandas":
+                raise ValueError(f"Invalid summary engine: {self.engine}")
+
+            if result is None:
+                result = self.summarize_pandas(preprocessed_data)
 
             if self.normalizer.normalization is not None:
                 self.normalizer.normalize(result, self.measures)
@@ -378,6 +582,45 @@ class TypeSummary(BaseModel):
             self.vlogger.error(str(e), 0)
             raise e
 
+        if key is not None:
+            self.summary_cache.put(key, result)
+
+        return result
+
+    def summarize_pandas(self, preprocessed_data: pd.DataFrame) -> pd.DataFrame:
+        "summarize with a pandas resample of each source"
+        self.vlogger.debug("Setting 'startDate' as index", 1)
+        # Not in place, preprocessed_data is shared (see preprocessed_data)
+        preprocessed_data = preprocessed_data.set_index("startDate")
+
+        self.vlogger.debug(
+            "Grouping, resampling, and applying aggregation functions", 2
+        )
+        result = (
+            preprocessed_data.groupby("sourceName", observed=True)["value"]
+            .resample(self.interval)
+            .apply(self.agg_sources)
+            .reset_index()[["startDate", "value"]]
+        )
+
+        if self.ffill:
+            self.vlogger.debug(
+                "Filling NaN values after resampling using forward fill", 2
+            )
+            result["value"].fillna(method="ffill", inplace=True)
+
+        self.vlogger.debug(
+            "Calculating desired summary measures for each resampled interval",
+            1,
+        )
+        result = result.groupby(["startDate"]).agg(self.measures)
+
+        self.vlogger.debug("Resetting index and flattening multi-index", 2)
+        result.reset_index(inplace=True)
+        result.columns = result.columns.map(
+            lambda x: x[1] if x[1] != "" else underscore(x[0])
+        )
+
         return result
 
     @lru_cache(maxsize=128)
@@ -401,3 +644,47 @@ class TypeSummary(BaseModel):
         self.vlogger.info("[End] Tabulating data to pandas dataframe", 0)
 
         return df
+
+
+def summarize_sweep(summaries: List[TypeSummary]) -> None:
+    """
+    Summarize TypeSummary objects that only differ by interval, like the
+    sweep of a parameter, in about one pass over their data (see
+    aggregation.summarize_sweep_bins). Their summarize() then returns the
+    rolled up summary; summaries with the pandas engine, or whose interval
+    or data the numpy engine does not support, are left to summarize()
+    as usual, and so are summaries found in their summary_cache.
+    """
+    sweeps = {}
+    for summary in summaries:
+        if summary.engine == "pandas" or summary.wrangled_data is None:
+            continue
+        key = summary.cache_key()
+        if key is not None and key in summary.summary_cache:
+            continue
+        key = (
+            id(summary.wrangled_data),
+            summary.agg_sources,
+            tuple(summary.measures),
+            summary.ffill,
+        )
+        sweeps.setdefault(key, []).append(summary)
+
+    for sweep in sweeps.values():
+        intervals = list(dict.fromkeys(summary.interval for summary in sweep))
+        vlogger = sweep[0].vlogger
+        vlogger.info(f"[START] Roll up summaries for intervals {intervals}", 0)
+
+        results = summarize_sweep_bins(
+            sweep[0].wrangled_data.preprocessed_data.dataframe,
+            intervals,
+            sweep[0].agg_sources,
+            sweep[0].measures,
+            ffill=sweep[0].ffill,
+        )
+        for summary in sweep:
+            if results[summary.interval] is not None:
+                # normalize() adds columns, so every summary gets its own
+                summary._swept = results[summary.interval].copy()
+
+        vlogger.info(f"[END] Roll up summaries for intervals {intervals}", 0)
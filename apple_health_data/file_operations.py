@@ -1,4 +1,6 @@
 import os
+import io
+import gzip
 import datetime
 import shutil
 import json
@@ -8,11 +10,19 @@ import deflate
 import zstandard
 import snappy
 import lzo
-from typing import Union, Optional
+import pandas as pd
+from contextlib import contextmanager
+from typing import Any, BinaryIO, Dict, Iterator, Union, Optional
 from pathlib import Path
 from inflection import underscore, dasherize
+from pydantic import BaseModel
 
 from apple_health_data.core.logger import VerbosityLogger
+from apple_health_data.core.series import SERIES_SUFFIX, read_series, write_series
+from apple_health_data.utils import DataFrameModel, restore_timezones
+
+ARTIFACT_SUFFIX = ".artifact.json"
+
 
 def remove_filename_extensions(filename, count=None, remove_all=False):
     parts = filename.split('.')
@@ -120,8 +130,16 @@ def rename_files(
             vlogger.info(f"Renamed file: {file_path.name} -> {new_filename}", 1)
 
 
+def zstd_decompress(data: bytes) -> bytes:
+    """
+    Decompress a zstd frame, also without a content size in its header,
+    as open_compressed writes them (zstandard.decompress needs one)
+    """
+    return zstandard.ZstdDecompressor().decompressobj().decompress(data)
+
+
 compression_functions = {
-    "zstd": (zstandard.compress, zstandard.decompress, "zst"),
+    "zstd": (zstandard.compress, zstd_decompress, "zst"),
     "snappy": (snappy.compress, snappy.decompress, "snappy"),
     "gzip": (deflate.gzip_compress, deflate.gzip_decompress, "gz"),
     "lzo": (lzo.compress, lzo.decompress, "lzo"),
@@ -173,48 +191,122 @@ def get_compression_codec(
     return None
 
 
+@contextmanager
+def open_compressed(
+    file_path: Union[str, Path],
+    compression_codec: Optional[str] = None,
+    compression_level: Optional[int] = None,
+    compression_threads: int = 0,
+) -> Iterator[BinaryIO]:
+    """
+    Binary stream that compresses what is written to it into file_path.
+    zstd and gzip compress in chunks as the stream is written, zstd with
+    compression_threads worker threads (-1 for one per CPU, 0 for none).
+    snappy and lzo are block formats, so they are compressed in one call
+    when the stream is closed. compression_level is the codec's own level,
+    its default if None; snappy has no levels, so giving one is an error.
+    """
+    if compression_level is not None and compression_codec in (None, "snappy"):
+        raise ValueError(f"No compression levels for {compression_codec or 'no compression'}")
+    if compression_codec is None:
+        with open(file_path, "wb") as file:
+            yield file
+    elif compression_codec == "zstd":
+        compressor = zstandard.ZstdCompressor(
+            level=3 if compression_level is None else compression_level,
+            threads=compression_threads,
+        )
+        with open(file_path, "wb") as file:
+            with compressor.stream_writer(file, closefd=False) as writer:
+                yield writer
+    elif compression_codec == "gzip":
+        level = 6 if compression_level is None else compression_level
+        with gzip.open(file_path, "wb", compresslevel=level) as file:
+            yield file
+    elif compression_codec in compression_functions:
+        buffer = io.BytesIO()
+        yield buffer
+        data = buffer.getbuffer()
+        if compression_codec == "lzo" and compression_level is not None:
+            compressed_data = lzo.compress(bytes(data), compression_level)
+        else:
+            compress_func, _, _ = compression_functions[compression_codec]
+            compressed_data = compress_func(bytes(data))
+        with open(file_path, "wb") as file:
+            file.write(compressed_data)
+    else:
+        raise ValueError("Invalid compression codec")
+
+
 def write_json(
     data: dict,
     file_path: Union[str, Path],
     compression_codec: Optional[str] = None,
     vlogger: VerbosityLogger = VerbosityLogger(),
+    compression_level: Optional[int] = None,
+    compression_threads: int = 0,
 ) -> Path:
+    """
+    Write data as indented JSON, compressed with compression_codec (see
+    open_compressed) if given. The JSON is encoded and compressed as it is
+    serialized, so the whole document is never held in memory as a string.
+    """
     file_path = Path(file_path)
 
-    # If no compression_codec is provided, save the data as a regular JSON file
     if compression_codec is None:
         filename = file_path.with_suffix(".json")
-        vlogger.info(f"[START] Write data to {filename}", 0)
-        with open(filename, "w") as file:
-            json.dump(data, file, default=str, indent=4)
-        vlogger.info(f"[END] Write data to {filename}", 0)
-        return filename
-
-    # If a compression_codec is provided, compress and save the data with the specified codec
     elif compression_codec in compression_functions:
-        compress_func, _, _ = compression_functions[compression_codec]
-        compressed_data = compress_func(
-            json.dumps(data, default=str, indent=4).encode()
-        )
         filename = file_path.with_suffix(
             f".json.{compression_functions[compression_codec][2]}"
         )
-        vlogger.info(f"[START] Write data to {filename}", 0)
-        with open(filename, "wb") as file:
-            file.write(compressed_data)
-        vlogger.info(f"[END] Write data to {filename}", 0)
-        return filename
-
-    # If an invalid compression_codec is provided, raise an error
     else:
         raise ValueError("Invalid compression codec")
 
+    vlogger.info(f"[START] Write data to {filename}", 0)
+    with open_compressed(
+        filename, compression_codec, compression_level, compression_threads
+    ) as stream:
+        file = io.TextIOWrapper(stream, encoding="utf-8")
+        json.dump(data, file, default=str, indent=4)
+        file.flush()
+        file.detach()
+    vlogger.info(f"[END] Write data to {filename}", 0)
+
+    return filename
+
 
 def generate_random_string(length):
     return "".join(
         random.choice(string.ascii_letters + string.digits) for _ in range(length)
     )
 
+@contextmanager
+def open_decompressed(
+    file_path: Union[str, Path], compression_codec: Optional[str] = None
+) -> Iterator[BinaryIO]:
+    """
+    Binary stream of the decompressed contents of file_path, which is read
+    once. zstd and gzip are decompressed in chunks as the stream is read;
+    snappy and lzo are block formats, so they are decompressed in memory.
+    """
+    if compression_codec is None:
+        with open(file_path, "rb") as file:
+            yield file
+    elif compression_codec == "zstd":
+        with open(file_path, "rb") as file:
+            with zstandard.ZstdDecompressor().stream_reader(file) as reader:
+                yield reader
+    elif compression_codec == "gzip":
+        with gzip.open(file_path, "rb") as file:
+            yield file
+    elif compression_codec in compression_functions:
+        _, decompress_func, _ = compression_functions[compression_codec]
+        with open(file_path, "rb") as file:
+            yield io.BytesIO(decompress_func(file.read()))
+    else:
+        raise ValueError("Invalid compression codec")
+
+
 def read_json(
     file_path: Union[str, Path],
     compression_codec: Optional[str] = None,
@@ -223,24 +315,125 @@ def read_json(
     file_path = Path(file_path)
     compression_codec = get_compression_codec(file_path, compression_codec)
 
-    if compression_codec is not None:
-        random_suffix = generate_random_string(8)
-        decompressed_filename = file_path.with_name(
-            f"decompressed_{random_suffix}.json"
+    # Decompressed in memory (see open_decompressed), no temporary file
+    vlogger.info(f"Reading data from {file_path}", 0)
+    with open_decompressed(file_path, compression_codec) as file:
+        data = json.load(file)
+
+    return data
+
+
+def write_artifact(
+    model: BaseModel,
+    file_path: Union[str, Path],
+    compression_codec: Optional[str] = None,
+    vlogger: VerbosityLogger = VerbosityLogger(),
+    compression_level: Optional[int] = None,
+    frame_format: str = "parquet",
+    **dump_kwargs: Any,
+) -> Path:
+    """
+    Binary counterpart of write_json(model.model_dump(**dump_kwargs)): the
+    DataFrames of the model's DataFrameModel fields are written as
+    <name>.<field>.parquet, with compression_codec, and everything else to
+    a small <name>.artifact.json metadata file, whose path is returned.
+    Unlike JSON, the frames are written column by column, with their types,
+    instead of as a dict per row. lzo is not a Parquet codec, so it falls
+    back to snappy. compression_level applies to zstd and gzip.
+    With frame_format series, frames are written uncompressed to
+    memory-mappable <name>.<field>.series stores instead (see write_series).
+    """
+    file_path = Path(file_path)
+    if frame_format not in ("parquet", "series"):
+        raise ValueError(f"Invalid frame format {frame_format}")
+    if compression_codec is not None and compression_codec not in compression_functions:
+        raise ValueError("Invalid compression codec")
+    if frame_format == "series" and compression_codec is not None:
+        vlogger.warning("Series stores are memory-mapped, not compressed", 1)
+    if compression_codec == "lzo":
+        vlogger.warning("lzo is not available for Parquet, using snappy", 1)
+        compression_codec = "snappy"
+    parquet_kwargs = {}
+    if compression_level is not None and compression_codec in ("zstd", "gzip"):
+        parquet_kwargs["compression_level"] = compression_level
+    elif compression_level is not None and frame_format == "parquet":
+        vlogger.warning(
+            f"{compression_codec or 'No compression'} has no levels in Parquet, "
+            f"ignoring compression level {compression_level}",
+            1,
         )
-        shutil.copy(file_path, decompressed_filename)
-        decompress_data(decompressed_filename, compression_codec)
-        delete_after_read = True
-    else:
-        decompressed_filename = file_path
-        delete_after_read = False
 
-    vlogger.info(f"Reading data from {decompressed_filename}", 0)
-    with open(decompressed_filename, "r") as file:
-        data = json.load(file)
+    exclude = set(dump_kwargs.pop("exclude", None) or set())
+    fields = [*model.model_fields, *model.model_computed_fields]
+    frames = {
+        field: getattr(model, field)
+        for field in fields
+        if field not in exclude
+        and isinstance(getattr(model, field), DataFrameModel)
+    }
+
+    filename = file_path.with_suffix(ARTIFACT_SUFFIX)
+    vlogger.info(f"[START] Write data to {filename}", 0)
+    metadata = {
+        "model": model.model_dump(exclude=exclude | set(frames), **dump_kwargs),
+        "frames": {},
+    }
+    for field, frame in frames.items():
+        if frame_format == "series":
+            frame_file = write_series(
+                frame.dataframe, file_path.with_suffix(f".{field}{SERIES_SUFFIX}")
+            )
+        else:
+            frame_file = file_path.with_suffix(f".{field}.parquet")
+            frame.dataframe.to_parquet(
+                frame_file, compression=compression_codec, index=False, **parquet_kwargs
+            )
+        metadata["frames"][field] = {
+            "file": frame_file.name,
+            "format": frame_format,
+            "dtypes": frame.dtypes,
+        }
+
+    with open(filename, "w") as file:
+        json.dump(metadata, file, default=str, indent=4)
+    vlogger.info(f"[END] Write data to {filename}", 0)
+
+    return filename
+
+
+def read_artifact(
+    file_path: Union[str, Path],
+    vlogger: VerbosityLogger = VerbosityLogger(),
+) -> Dict[str, Any]:
+    """
+    Read an artifact written by write_artifact into the data of its model,
+    with DataFrames in place of the rows of its DataFrameModel fields, so
+    it can be validated with TypeAdapter(...).validate_python. Frames in
+    series stores are memory-mapped rather than read.
+    """
+    file_path = Path(file_path)
+
+    vlogger.info(f"Reading data from {file_path}", 0)
+    with open(file_path, "r") as file:
+        metadata = json.load(file)
 
-    if delete_after_read:
-        os.remove(decompressed_filename)  # Delete the decompressed file
+    data = metadata["model"]
+    for field, frame in metadata["frames"].items():
+        frame_file = file_path.parent / frame["file"]
+        if frame.get("format") == "series":
+            dataframe = read_series(frame_file)
+        else:
+            dataframe = restore_timezones(pd.read_parquet(frame_file))
+        data[field] = {"dataframe": dataframe, "dtypes": frame["dtypes"]}
 
     return data
 
+
+def read_model_data(
+    file_path: Union[str, Path],
+    vlogger: VerbosityLogger = VerbosityLogger(),
+) -> Dict[str, Any]:
+    "Data of a model written by write_artifact or write_json"
+    if str(file_path).endswith(ARTIFACT_SUFFIX):
+        return read_artifact(file_path, vlogger=vlogger)
+    return read_json(file_path, vlogger=vlogger)
@@ -1,25 +1,351 @@
+import datetime
+import hashlib
+import json
+import os
+import numpy as np
 import pandas as pd
-import mmh3
+import pyarrow as pa
 from pathlib import Path
-from typing import Dict, Any, List, Tuple, Optional, Union
+from typing import Dict, Any, ClassVar, List, Tuple, Optional, Union, Callable
 import pandas as pd
 from pathlib import Path
-from pydantic import BaseModel, Field, field_serializer, ConfigDict
+from pydantic import BaseModel, Field, PrivateAttr, field_serializer, ConfigDict
+from functools import lru_cache
 
+OFFSET_SUFFIX = "Offset"
+NS_PER_MINUTE = 60_000_000_000
+APPLE_DATE_SEPARATORS = {4: b"-", 7: b"-", 10: b" ", 13: b":", 16: b":", 19: b" "}
+APPLE_DATE_DIGITS = [0, 1, 2, 3, 5, 6, 8, 9, 11, 12, 14, 15, 17, 18, 21, 22, 23, 24]
+DIGEST_SIZE = 20
+DIGEST_BLOCK_SIZE = 2**20
 
-def hash_model(data_tuple: Tuple[Union[int, str, list, dict, pd.DataFrame]]) -> int:
-    hashed_vals = []
 
-    for data in data_tuple:
-        if isinstance(data, pd.DataFrame):
-            hashed_val = pd.util.hash_pandas_object(data).sum()
-        else:
-            hashed_val = mmh3.hash(str(data))
+def frame_digest(df: pd.DataFrame) -> str:
+    "Hex digest of the contents, column names and dtypes of a DataFrame"
+    digest = hashlib.blake2b(digest_size=DIGEST_SIZE)
+    digest.update(pd.util.hash_pandas_object(df, index=True).to_numpy().tobytes())
+    digest.update(repr((df.columns.tolist(), df.dtypes.astype(str).tolist())).encode())
+    return digest.hexdigest()
+
+
+def file_digest(file_path: Union[str, Path]) -> str:
+    """
+    Hex digest of the size and contents of a file. Digests are memoized by
+    path, size and modification time, so a file is read once per process.
+    The digest only depends on the contents: a file that is written again
+    with the same data (e.g. parsed from the same export) keeps it.
+    """
+    status = os.stat(file_path)
+    return _file_digest(
+        str(Path(file_path).resolve()), status.st_size, status.st_mtime_ns
+    )
+
+
+@lru_cache(maxsize=256)
+def _file_digest(file_path: str, size: int, mtime_ns: int) -> str:
+    digest = hashlib.blake2b(digest_size=DIGEST_SIZE)
+    digest.update(str(size).encode())
+    with open(file_path, "rb") as f:
+        for block in iter(lambda: f.read(DIGEST_BLOCK_SIZE), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def fingerprint(*parts: Any) -> str:
+    """
+    Hex digest of parts, stable across processes and runs (unlike hash()):
+    DataFrames are digested by contents, pydantic models by their dump and
+    anything else JSON can't encode by str.
+    """
+
+    def encode(part: Any) -> Any:
+        if isinstance(part, pd.DataFrame):
+            return frame_digest(part)
+        if isinstance(part, BaseModel):
+            return part.model_dump()
+        return str(part)
+
+    content = json.dumps(parts, sort_keys=True, default=encode)
+    return hashlib.blake2b(content.encode(), digest_size=DIGEST_SIZE).hexdigest()
+
+
+def fingerprint_hash(digest: str) -> int:
+    "__hash__ of a model from its fingerprint"
+    return int(digest[:16], 16)
+
+
+def days_from_civil(year: np.ndarray, month: np.ndarray, day: np.ndarray) -> np.ndarray:
+    "Days since 1970-01-01 of proleptic Gregorian dates (H. Hinnant's algorithm)"
+    year = year - (month <= 2)
+    era = np.floor_divide(year, 400)
+    year_of_era = year - era * 400
+    day_of_year = (153 * np.where(month > 2, month - 3, month + 9) + 2) // 5 + day - 1
+    day_of_era = (
+        year_of_era * 365 + year_of_era // 4 - year_of_era // 100 + day_of_year
+    )
+    return era * 146097 + day_of_era - 719468
+
+
+def civil_from_days(days: np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    "Inverse of days_from_civil: (year, month, day) of days since 1970-01-01"
+    days = days + 719468
+    era = np.floor_divide(days, 146097)
+    day_of_era = days - era * 146097
+    year_of_era = (
+        day_of_era - day_of_era // 1460 + day_of_era // 36524 - day_of_era // 146096
+    ) // 365
+    day_of_year = day_of_era - (365 * year_of_era + year_of_era // 4 - year_of_era // 100)
+    mp = (5 * day_of_year + 2) // 153
+    day = day_of_year - (153 * mp + 2) // 5 + 1
+    month = np.where(mp < 10, mp + 3, mp - 9)
+    year = year_of_era + era * 400 + (month <= 2)
+    return year, month, day
+
+
+def decode_date_chars(chars: np.ndarray) -> Optional[Tuple[np.ndarray, np.ndarray]]:
+    """
+    Decode an (n, 25) uint8 array holding the characters of n export.xml
+    dates, such as 2023-05-01 08:00:00 -0400, one per row, with integer
+    arithmetic. Returns int64 nanoseconds since the epoch (UTC) and int16
+    UTC offsets in minutes, or None if any row is not in this format.
+    """
+    for position, separator in APPLE_DATE_SEPARATORS.items():
+        if (chars[:, position] != ord(separator)).any():
+            return None
+    sign = chars[:, 20]
+    if ((sign != ord("+")) & (sign != ord("-"))).any():
+        return None
+    digits = chars[:, APPLE_DATE_DIGITS] - ord("0")
+    if (digits > 9).any():
+        return None
+    digits = digits.astype(np.int64)
+
+    def number(*columns: int) -> np.ndarray:
+        value = 0
+        for column in columns:
+            value = value * 10 + digits[:, APPLE_DATE_DIGITS.index(column)]
+        return value
+
+    days = days_from_civil(number(0, 1, 2, 3), number(5, 6), number(8, 9))
+    seconds = days * 86400 + number(11, 12) * 3600 + number(14, 15) * 60 + number(17, 18)
+    offset = number(21, 22) * 60 + number(23, 24)
+    offset = np.where(sign == ord("-"), -offset, offset)
+
+    return (seconds - offset * 60) * 1_000_000_000, offset.astype(np.int16)
+
+
+def decode_apple_dates(
+    dates: Union[pd.Series, np.ndarray, List[str]]
+) -> Optional[Tuple[np.ndarray, np.ndarray]]:
+    """
+    Vectorized decoder for the fixed-format dates of export.xml, such as
+    2023-05-01 08:00:00 -0400. Instead of pd.to_datetime's generic
+    parsing, the digits are read straight from the bytes of the strings
+    with integer arithmetic (see decode_date_chars). Returns int64
+    nanoseconds since the epoch (UTC) and int16 UTC offsets in minutes,
+    with NaT and 0 for missing dates, or None if the values are not in
+    this format.
+    """
+    dates = pd.Series(dates)
+    missing = dates.isna().to_numpy()
+    epoch = np.full(len(dates), np.iinfo(np.int64).min, dtype=np.int64)
+    offsets = np.zeros(len(dates), dtype=np.int16)
+    if missing.all():
+        return epoch, offsets
+
+    try:
+        raw = np.asarray(dates[~missing].to_numpy(), dtype="S26")
+    except (UnicodeError, ValueError, TypeError):
+        return None
+    chars = raw.view(np.uint8).reshape(-1, 26)
+
+    # Exactly 25 characters
+    if (chars[:, 25] != 0).any() or (chars[:, 24] == 0).any():
+        return None
+    decoded = decode_date_chars(chars[:, :25])
+    if decoded is None:
+        return None
+
+    epoch[~missing], offsets[~missing] = decoded
+    return epoch, offsets
+
+
+def decode_arrow_dates(
+    dates: Union[pa.Array, pa.ChunkedArray]
+) -> Optional[Tuple[np.ndarray, np.ndarray]]:
+    """
+    decode_apple_dates for an Arrow string column, such as a date column
+    read by pyarrow.csv. When every date is present the characters are
+    decoded in place from the column's data buffer, without building a
+    Python string per row.
+    """
+    if isinstance(dates, pa.ChunkedArray):
+        dates = dates.combine_chunks()
+    if not pa.types.is_string(dates.type) or dates.null_count or len(dates) == 0:
+        return decode_apple_dates(dates.to_numpy(zero_copy_only=False))
+
+    offsets = np.frombuffer(dates.buffers()[1], dtype=np.int32)
+    offsets = offsets[dates.offset : dates.offset + len(dates) + 1]
+    if (np.diff(offsets) != 25).any():
+        return None
+    data = np.frombuffer(dates.buffers()[2], dtype=np.uint8)
+    return decode_date_chars(data[offsets[0] : offsets[-1]].reshape(-1, 25))
 
-        hashed_vals.append(hashed_val)
 
-    combined_hash = mmh3.hash(str(hashed_vals))
-    return combined_hash
+def epoch_to_datetime(
+    epoch_ns: Union[np.ndarray, pd.Series], offset_minutes: Union[np.ndarray, pd.Series]
+) -> pd.DatetimeIndex:
+    """
+    Datetimes from nanoseconds since the epoch (UTC) and UTC offsets in
+    minutes, as written by the parser's Parquet output or decoded by
+    decode_apple_dates. If every row has the same offset the result is
+    tz-aware in that fixed offset, like pd.to_datetime on the original
+    date strings; otherwise it is the tz-naive local (wall-clock) time of
+    each row.
+    """
+    epoch_ns = pd.Series(epoch_ns)
+    offset_minutes = pd.Series(offset_minutes)
+    valid = epoch_ns.notna() & (epoch_ns != np.iinfo(np.int64).min)
+    offsets = offset_minutes[valid.to_numpy()].dropna().unique()
+
+    if len(offsets) <= 1:
+        minutes = int(offsets[0]) if len(offsets) else 0
+        tz = datetime.timezone(datetime.timedelta(minutes=minutes))
+        return pd.DatetimeIndex(pd.to_datetime(epoch_ns, unit="ns", utc=True)).tz_convert(tz)
+
+    local_ns = epoch_ns + offset_minutes.fillna(0).astype("int64") * NS_PER_MINUTE
+    return pd.DatetimeIndex(pd.to_datetime(local_ns.where(valid), unit="ns"))
+
+
+def restore_timezones(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Parquet reads fixed UTC offsets back as pytz timezones; convert them
+    to the datetime.timezone that epoch_to_datetime gives
+    """
+    for col in df.columns:
+        tz = getattr(df[col].dtype, "tz", None)
+        if tz is None or isinstance(tz, datetime.timezone):
+            continue
+        offset = tz.utcoffset(None)
+        if offset is not None:
+            df[col] = df[col].dt.tz_convert(datetime.timezone(offset))
+    return df
+
+
+def datetime_to_epoch(
+    column: pd.Series, offset_minutes: Optional[pd.Series] = None
+) -> np.ndarray:
+    """
+    Inverse of epoch_to_datetime: int64 nanoseconds since the epoch, in UTC
+    for tz-aware columns or when the offsets of local times are known,
+    and NaT as the minimum int64.
+    """
+    index = pd.DatetimeIndex(column).as_unit("ns")
+    epoch = index.asi8.copy()
+    if index.tz is None and offset_minutes is not None:
+        valid = ~index.isna()
+        epoch[valid] -= (
+            np.asarray(offset_minutes, dtype=np.int64)[valid] * NS_PER_MINUTE
+        )
+    return epoch
+
+
+def utc_offsets(column: pd.Series) -> np.ndarray:
+    "UTC offsets in minutes of a tz-aware datetime column, 0 for NaT"
+    index = pd.DatetimeIndex(column).as_unit("ns")
+    local = index.tz_localize(None).asi8
+    return ((local - index.asi8) // NS_PER_MINUTE).astype(np.int16)
+
+
+def decode_epoch_columns(df: pd.DataFrame) -> pd.DataFrame:
+    "Convert every <col> that has an <col>Offset companion to datetimes"
+    for col in df.columns:
+        offset_col = f"{col}{OFFSET_SUFFIX}"
+        if offset_col in df.columns and not pd.api.types.is_datetime64_any_dtype(
+            df[col]
+        ):
+            df[col] = epoch_to_datetime(df[col], df[offset_col])
+
+    return df
+
+
+def sorted_categorical(column: pd.Series) -> pd.Series:
+    """
+    Categorical version of column with sorted categories, so that sorting
+    and grouping by it gives the same order as for the plain strings.
+    Categoricals read from Parquet keep the order in which values first
+    appeared.
+    """
+    if not isinstance(column.dtype, pd.CategoricalDtype):
+        return column.astype("category")
+    categories = column.cat.categories
+    if categories.is_monotonic_increasing:
+        return column
+    return column.cat.reorder_categories(categories.sort_values())
+
+
+def map_categories(
+    column: pd.Series, func: Callable[[pd.Index], pd.Index]
+) -> pd.Series:
+    """
+    Apply func to the (few) categories of a categorical column instead of
+    its (many) rows. Categories that func maps to the same value are
+    merged, and the result has sorted categories.
+    """
+    mapped = pd.Index(func(column.cat.categories))
+    categories = mapped.unique().sort_values()
+    recode = categories.get_indexer(mapped)
+    codes = column.cat.codes.to_numpy()
+    codes = np.where(codes >= 0, recode[codes], -1)
+    return pd.Series(
+        pd.Categorical.from_codes(codes, categories=categories),
+        index=column.index,
+        name=column.name,
+    )
+
+
+def map_values(
+    column: pd.Series, func: Callable[[pd.Index], pd.Index]
+) -> pd.Series:
+    """
+    Apply func to the unique values of a column instead of its rows, see
+    map_categories for categorical columns. Missing values stay missing.
+    """
+    if isinstance(column.dtype, pd.CategoricalDtype):
+        return map_categories(column, func)
+    codes, uniques = pd.factorize(column)
+    mapped = pd.Index(func(uniques)).take(codes, allow_fill=True, fill_value=np.nan)
+    return pd.Series(mapped.to_numpy(), index=column.index, name=column.name)
+
+
+def is_sorted_by(df: pd.DataFrame, columns: List[str]) -> bool:
+    """
+    Whether df is already in the order df.sort_values(by=columns) gives.
+    Only numeric and datetime columns without missing values are checked,
+    any other column counts as unsorted.
+    """
+    ties = None
+    for name in columns:
+        column = df[name]
+        if column.hasnans:
+            return False
+        if pd.api.types.is_datetime64_any_dtype(column.dtype):
+            values = column.array.asi8
+        elif pd.api.types.is_numeric_dtype(column.dtype):
+            values = column.to_numpy()
+        else:
+            return False
+        previous, current = values[:-1], values[1:]
+        descending = current < previous
+        if ties is not None:
+            descending &= ties
+        if descending.any():
+            return False
+        equal = current == previous
+        ties = equal if ties is None else ties & equal
+        if not ties.any():
+            return True
+    return True
 
 
 def get_df_dtypes(df: pd.DataFrame) -> Dict[str, List[str]]:
@@ -36,10 +362,16 @@ class DataFrameModel(BaseModel):
     dataframe: Union[pd.DataFrame, Dict[str, Any], List[Dict[str, Any]]]
     dtypes: Optional[Dict[str, List[str]]] = Field(default=None)
 
+    # Number of frames built (converted and typecast) in this process
+    materialized: ClassVar[int] = 0
+
+    _fingerprint: Optional[str] = PrivateAttr(default=None)
+
     model_config = ConfigDict(arbitrary_types_allowed=True, frozen=True)
 
     def __init__(self, **data: Any):
         super().__init__(**data)
+        DataFrameModel.materialized += 1
 
         object.__setattr__(self, "dataframe", pd.DataFrame(self.dataframe))
 
@@ -47,10 +379,35 @@ class DataFrameModel(BaseModel):
             self.typecast_cols()
 
     def __hash__(self):
-        return hash_model((self.dataframe, self.dtypes))
+        return fingerprint_hash(self.fingerprint)
+
+    @property
+    def fingerprint(self) -> str:
+        "Digest of the frame, computed on first use since it reads every row"
+        if self._fingerprint is None:
+            self._fingerprint = fingerprint(self.dataframe, self.dtypes)
+        return self._fingerprint
 
     @field_serializer("dataframe")
     def serialize_df(self, data: pd.DataFrame) -> List[Dict[str, Any]]:
+        """
+        Datetimes are written as epoch nanoseconds so loading them never
+        re-parses strings. A tz-aware column without a <col>Offset column
+        gets one, so that typecast_datetime_col restores its local times.
+        """
+        datetime_cols = [
+            col
+            for col in data.columns
+            if pd.api.types.is_datetime64_any_dtype(data[col])
+        ]
+        if datetime_cols:
+            data = data.copy(deep=False)
+            for col in datetime_cols:
+                offset_col = f"{col}{OFFSET_SUFFIX}"
+                offsets = data.get(offset_col)
+                if offsets is None and getattr(data[col].dtype, "tz", None) is not None:
+                    offsets = data[offset_col] = utc_offsets(data[col])
+                data[col] = datetime_to_epoch(data[col], offsets)
         return data.to_dict(orient="records")
 
     def typecast_cols(self):
@@ -58,17 +415,53 @@ class DataFrameModel(BaseModel):
             for col in columns:
                 if col in self.dataframe.columns:
                     if col_type.startswith("datetime64"):
-                        offset = col.find(", ")
-                        if offset != -1:
-                            tz = col[offset + 2 :]
-                            self.dataframe[col] = pd.to_datetime(
-                                self.dataframe[col], utc=True, tz=tz
-                            )
-                        else:
-                            self.dataframe[col] = pd.to_datetime(self.dataframe[col])
-                    else:
+                        self.typecast_datetime_col(col, col_type)
+                    elif col_type == "category":
+                        self.dataframe[col] = sorted_categorical(self.dataframe[col])
+                    elif str(self.dataframe[col].dtype) != col_type:
+                        # Casting to the same dtype would copy memory-mapped columns
                         self.dataframe[col] = self.dataframe[col].astype(col_type)
 
+    def typecast_datetime_col(self, col: str, col_type: str):
+        """
+        Convert a column to datetimes without re-parsing anything that was
+        already decoded: datetime columns are left alone, epoch
+        nanoseconds (see serialize_df) are converted directly, to the
+        local times of their <col>Offset column if there is one, and
+        export.xml date strings are decoded once with decode_apple_dates,
+        which also stores the UTC offsets in an int16 <col>Offset column.
+        Other strings fall back to pd.to_datetime.
+        """
+        column = self.dataframe[col]
+        offset_col = f"{col}{OFFSET_SUFFIX}"
+        tz = getattr(pd.api.types.pandas_dtype(col_type), "tz", None)
+
+        if pd.api.types.is_datetime64_any_dtype(column):
+            return
+
+        if pd.api.types.is_integer_dtype(column):
+            if offset_col in self.dataframe.columns:
+                self.dataframe[col] = epoch_to_datetime(
+                    column, self.dataframe[offset_col]
+                )
+            elif tz is not None:
+                self.dataframe[col] = pd.to_datetime(
+                    column, unit="ns", utc=True
+                ).dt.tz_convert(tz)
+            else:
+                self.dataframe[col] = pd.to_datetime(column, unit="ns")
+            return
+
+        decoded = decode_apple_dates(column)
+        if decoded is not None:
+            epoch, offsets = decoded
+            self.dataframe[col] = epoch_to_datetime(epoch, offsets)
+            self.dataframe[offset_col] = offsets
+        elif tz is not None:
+            self.dataframe[col] = pd.to_datetime(column, utc=True).dt.tz_convert(tz)
+        else:
+            self.dataframe[col] = pd.to_datetime(column)
+
 
 def save_dataframe(
     df: pd.DataFrame, file_path: Path, file_format: str = "csv", *args, **kwargs
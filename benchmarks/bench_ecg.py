@@ -0,0 +1,68 @@
+"""
+ECG store: ingest time by worker count and latency of loading one waveform.
+
+    python -m benchmarks.bench_ecg --recordings 1000 --workers 1 2 4 8
+"""
+import argparse
+import os
+import tempfile
+import time
+
+import numpy as np
+
+from pathlib import Path
+
+from apple_health_data.core.ecg import extract_ecgs, load_ecg, read_ecg_index
+from benchmarks.synthetic_export import write_synthetic_ecgs
+
+
+def run(export_zip: Path, store_directory: Path, workers: int) -> float:
+    start = time.perf_counter()
+    extract_ecgs(export_zip, store_directory, workers=workers)
+    return time.perf_counter() - start
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--export-zip", type=str, help="Existing export.zip to parse")
+    parser.add_argument("--recordings", type=int, default=300)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4, 8])
+    parser.add_argument("--loads", type=int, default=100)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        tmp = Path(tmp)
+        if args.export_zip is not None:
+            export_zip = Path(args.export_zip)
+        else:
+            export_zip = write_synthetic_ecgs(tmp / "export.zip", args.recordings)
+        size_mb = export_zip.stat().st_size / 2**20
+
+        serial = tmp / "serial"
+        baseline = run(export_zip, serial, 1)
+        print(f"{export_zip} ({size_mb:.0f} MB), {os.cpu_count()} CPUs")
+        print(f"{'workers':>8} {'seconds':>10} {'speedup':>8} {'identical':>10}")
+        print(f"{'serial':>8} {baseline:>10.2f} {1.0:>8.2f} {'-':>10}")
+        for workers in args.workers:
+            if workers < 2:
+                continue
+            target = tmp / f"workers-{workers}"
+            elapsed = run(export_zip, target, workers)
+            identical = read_ecg_index(target).equals(read_ecg_index(serial)) and (
+                (target / "samples.f32").read_bytes() == (serial / "samples.f32").read_bytes()
+            )
+            print(f"{workers:>8} {elapsed:>10.2f} {baseline / elapsed:>8.2f} {str(identical):>10}")
+
+        index = read_ecg_index(serial)
+        dates = index["recordedDate"].sample(args.loads, replace=True, random_state=0)
+        timings = []
+        for date in dates:
+            start = time.perf_counter()
+            _, samples = load_ecg(serial, date, index=index)
+            float(np.abs(samples).max())  # touch every sample
+            timings.append(time.perf_counter() - start)
+        timings = np.array(timings) * 1000
+        print(
+            f"load one waveform: median {np.median(timings):.2f} ms, "
+            f"p95 {np.percentile(timings, 95):.2f} ms"
+        )
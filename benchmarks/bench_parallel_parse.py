@@ -0,0 +1,64 @@
+"""
+Speedup of HealthDataExtractor's parallel mode by worker count.
+
+    python -m benchmarks.bench_parallel_parse --records 2000000 --workers 1 2 4 8
+"""
+import argparse
+import filecmp
+import os
+import tempfile
+import time
+
+from pathlib import Path
+
+from apple_health_data.core.parser import HealthDataExtractor
+from benchmarks.synthetic_export import write_synthetic_export
+
+
+def run(export_xml: Path, target_directory: Path, workers: int) -> float:
+    target_directory.mkdir()
+    start = time.perf_counter()
+    extractor = HealthDataExtractor(
+        path=str(export_xml),
+        target_directory=str(target_directory),
+        streaming=True,
+        workers=workers,
+    )
+    extractor.extract()
+    return time.perf_counter() - start
+
+
+def same_outputs(a: Path, b: Path) -> bool:
+    names = sorted(os.listdir(a))
+    if names != sorted(os.listdir(b)):
+        return False
+    _, mismatch, errors = filecmp.cmpfiles(a, b, names, shallow=False)
+    return not mismatch and not errors
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--export-xml", type=str, help="Existing export.xml to parse")
+    parser.add_argument("--records", type=int, default=500000)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4, 8])
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        tmp = Path(tmp)
+        if args.export_xml is not None:
+            export_xml = Path(args.export_xml)
+        else:
+            export_xml = write_synthetic_export(tmp / "export.xml", args.records)
+        size_mb = export_xml.stat().st_size / 2**20
+
+        baseline = run(export_xml, tmp / "serial", 1)
+        print(f"{export_xml} ({size_mb:.0f} MB), {os.cpu_count()} CPUs")
+        print(f"{'workers':>8} {'seconds':>10} {'speedup':>8} {'identical':>10}")
+        print(f"{'serial':>8} {baseline:>10.2f} {1.0:>8.2f} {'-':>10}")
+        for workers in args.workers:
+            if workers < 2:
+                continue
+            target = tmp / f"workers-{workers}"
+            elapsed = run(export_xml, target, workers)
+            identical = same_outputs(tmp / "serial", target)
+            print(f"{workers:>8} {elapsed:>10.2f} {baseline / elapsed:>8.2f} {str(identical):>10}")
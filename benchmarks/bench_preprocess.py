@@ -0,0 +1,40 @@
+"""
+DataWrangler.preprocess on sorted and shuffled frames, with and without filter_sources.
+
+    python -m benchmarks.bench_preprocess --rows 10000000 --sources 4
+"""
+import argparse
+import time
+
+from apple_health_data.core.summarizer import DataWrangler
+from benchmarks.bench_summarize import synthetic_heart_rate
+
+
+def run(parsed_data, filter_sources) -> (float, int):
+    wrangled_data = DataWrangler(parsed_data=parsed_data, filter_sources=filter_sources)
+    start = time.perf_counter()
+    rows = len(wrangled_data.preprocess())
+    return time.perf_counter() - start, rows
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--rows", type=int, default=10_000_000)
+    parser.add_argument("--sources", type=int, default=4)
+    parser.add_argument("--days", type=int, default=365)
+    args = parser.parse_args()
+
+    sorted_data = synthetic_heart_rate(args.rows, args.sources, args.days)
+    sorted_data["sourceName"] = sorted_data["sourceName"].astype("category")
+    frames = {
+        "sorted": sorted_data,
+        "shuffled": sorted_data.sample(frac=1, random_state=0),
+    }
+    filters = {"none": None, "half": [f"Watch {i}" for i in range(0, args.sources, 2)]}
+
+    print(f"{args.rows} rows, {args.sources} sources, {args.days} days")
+    print(f"{'order':>8} {'filter':>6} {'rows':>10} {'seconds':>8}")
+    for order, parsed_data in frames.items():
+        for name, filter_sources in filters.items():
+            seconds, rows = run(parsed_data, filter_sources)
+            print(f"{order:>8} {name:>6} {rows:>10} {seconds:>8.3f}")
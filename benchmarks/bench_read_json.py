@@ -0,0 +1,98 @@
+"""
+read_json latency per codec: in-memory decompression against the previous
+copy to a temporary file, decompress it on disk, then json.load it.
+
+    python -m benchmarks.bench_read_json --rows 500000 --repeat 5
+"""
+import argparse
+import json
+import os
+import random
+import shutil
+import tempfile
+import time
+
+from pathlib import Path
+
+from apple_health_data.file_operations import (
+    compression_functions,
+    decompress_data,
+    read_json,
+    write_json,
+)
+
+
+def make_data(n_rows: int, seed: int = 0) -> dict:
+    "A dump shaped like wrangled heart-rate data, one dict per row"
+    rng = random.Random(seed)
+    start = 1_609_459_200_000_000_000
+    return {
+        "type": "HKQuantityTypeIdentifierHeartRate",
+        "parsed_data": {
+            "dataframe": [
+                {
+                    "sourceName": f"Watch {rng.randint(0, 3)}",
+                    "unit": "count/min",
+                    "startDate": start + i * 30_000_000_000,
+                    "startDateOffset": -240,
+                    "value": float(rng.randint(40, 160)),
+                }
+                for i in range(n_rows)
+            ],
+            "dtypes": None,
+        },
+    }
+
+
+def read_via_copy(file_path: Path, compression_codec: str) -> dict:
+    "The previous read_json: three passes over the file on disk"
+    copy_path = file_path.with_name("decompressed_benchmark.json")
+    shutil.copy(file_path, copy_path)
+    decompress_data(copy_path, compression_codec)
+    with open(copy_path, "r") as file:
+        data = json.load(file)
+    os.remove(copy_path)
+    return data
+
+
+def best_of(repeat: int, function, *args, **kwargs) -> float:
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function(*args, **kwargs)
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--rows", type=int, default=200_000)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument(
+        "--codecs", type=str, nargs="+", default=[None, *compression_functions]
+    )
+    args = parser.parse_args()
+
+    data = make_data(args.rows)
+
+    results = []
+    with tempfile.TemporaryDirectory() as tmp:
+        for codec in args.codecs:
+            file_path = write_json(data, Path(tmp) / "data", compression_codec=codec)
+            if read_json(file_path) != data:
+                raise AssertionError(f"{file_path} does not round-trip")
+            size = file_path.stat().st_size
+            copied = (
+                best_of(args.repeat, read_via_copy, file_path, codec)
+                if codec is not None
+                else None
+            )
+            streamed = best_of(args.repeat, read_json, file_path)
+            results.append((codec or "none", size, copied, streamed))
+            file_path.unlink()
+
+    print(f"{args.rows} rows, best of {args.repeat}")
+    print(f"{'codec':<8} {'MB':>8} {'copy (s)':>10} {'memory (s)':>11}")
+    for codec, size, copied, streamed in results:
+        copied = f"{copied:>10.2f}" if copied is not None else f"{'-':>10}"
+        print(f"{codec:<8} {size / 2**20:>8.1f} {copied} {streamed:>11.2f}")
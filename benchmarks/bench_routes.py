@@ -0,0 +1,63 @@
+"""
+Speedup of workout route extraction by worker count.
+
+    python -m benchmarks.bench_routes --routes 2000 --points 2000 --workers 1 2 4 8
+"""
+import argparse
+import os
+import tempfile
+import time
+
+import pyarrow.parquet as pq
+
+from pathlib import Path
+
+from apple_health_data.core.routes import extract_routes
+from benchmarks.synthetic_export import write_synthetic_routes
+
+
+def run(export_zip: Path, target_file: Path, workers: int) -> float:
+    start = time.perf_counter()
+    extract_routes(export_zip, target_file, workers=workers)
+    return time.perf_counter() - start
+
+
+def read_points(target_file: Path):
+    """
+    Trackpoints as a data frame with plain route strings: row groups and
+    route dictionaries depend on the worker count, the data does not
+    """
+    points = pq.read_table(target_file).to_pandas()
+    points["route"] = points["route"].astype(str)
+    return points
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--export-zip", type=str, help="Existing export.zip to parse")
+    parser.add_argument("--routes", type=int, default=500)
+    parser.add_argument("--points", type=int, default=2000)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4, 8])
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        tmp = Path(tmp)
+        if args.export_zip is not None:
+            export_zip = Path(args.export_zip)
+        else:
+            export_zip = write_synthetic_routes(tmp / "export.zip", args.routes, args.points)
+        size_mb = export_zip.stat().st_size / 2**20
+
+        serial = tmp / "serial.parquet"
+        baseline = run(export_zip, serial, 1)
+        expected = read_points(serial)
+        print(f"{export_zip} ({size_mb:.0f} MB, {len(expected)} points), {os.cpu_count()} CPUs")
+        print(f"{'workers':>8} {'seconds':>10} {'speedup':>8} {'identical':>10}")
+        print(f"{'serial':>8} {baseline:>10.2f} {1.0:>8.2f} {'-':>10}")
+        for workers in args.workers:
+            if workers < 2:
+                continue
+            target = tmp / f"workers-{workers}.parquet"
+            elapsed = run(export_zip, target, workers)
+            identical = read_points(target).equals(expected)
+            print(f"{workers:>8} {elapsed:>10.2f} {baseline / elapsed:>8.2f} {str(identical):>10}")
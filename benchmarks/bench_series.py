@@ -0,0 +1,71 @@
+"""
+Load and summarize wrangled data per artifact format: JSON rows, Parquet
+frames, and memory-mapped series stores.
+
+    python -m benchmarks.bench_series --rows 2000000 --interval 1D
+"""
+import argparse
+import tempfile
+import time
+
+from pathlib import Path
+
+from pydantic import TypeAdapter
+
+from apple_health_data.config_processor import write_model
+from apple_health_data.core.summarizer import DataWrangler, TypeSummary
+from apple_health_data.file_operations import read_model_data
+from benchmarks.bench_summarize import synthetic_heart_rate
+
+FORMATS = ["json", "parquet", "series"]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--rows", type=int, default=500_000)
+    parser.add_argument("--sources", type=int, default=3)
+    parser.add_argument("--interval", type=str, default="1H")
+    parser.add_argument("--formats", type=str, nargs="+", default=FORMATS)
+    args = parser.parse_args()
+
+    wrangled_data = DataWrangler(
+        parsed_data=synthetic_heart_rate(args.rows, args.sources, 365)
+    )
+
+    results = []
+    expected = None
+    with tempfile.TemporaryDirectory() as tmp:
+        for artifact_format in args.formats:
+            start = time.perf_counter()
+            wrangled_file = write_model(
+                model=wrangled_data,
+                file_path=Path(tmp) / artifact_format,
+                artifact_format=artifact_format,
+                exclude={"vlogger_config"},
+            )
+            written = time.perf_counter() - start
+
+            start = time.perf_counter()
+            wrangled_obj = TypeAdapter(DataWrangler).validate_python(
+                read_model_data(wrangled_file)
+            )
+            loaded = time.perf_counter() - start
+
+            start = time.perf_counter()
+            summary = TypeSummary(
+                wrangled_data=wrangled_obj, interval=args.interval, measures=["mean", "max"]
+            ).summarize()
+            summarized = time.perf_counter() - start
+
+            if expected is None:
+                expected = summary
+            elif not summary.reset_index(drop=True).equals(
+                expected.reset_index(drop=True)
+            ):
+                raise AssertionError(f"{artifact_format} summary differs")
+            results.append((artifact_format, written, loaded, summarized))
+
+    print(f"{args.rows} rows, {args.interval} summary")
+    print(f"{'format':<8} {'write (s)':>10} {'load (s)':>9} {'summarize (s)':>14}")
+    for artifact_format, written, loaded, summarized in results:
+        print(f"{artifact_format:<8} {written:>10.2f} {loaded:>9.2f} {summarized:>14.2f}")
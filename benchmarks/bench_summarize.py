@@ -0,0 +1,129 @@
+"""
+TypeSummary.summarize: pandas resample vs numpy time-bin engine by interval.
+
+Then the whole sweep of intervals: one summary per interval with each
+engine vs summarize_sweep, which rolls the intervals up from one pass.
+
+    python -m benchmarks.bench_summarize --rows 2000000 --sources 4
+"""
+import argparse
+import time
+
+import numpy as np
+import pandas as pd
+
+from typing import List, Optional
+
+from apple_health_data.core.summarizer import DataWrangler, TypeSummary, summarize_sweep
+
+MEASURES = ["sum", "mean", "median", "count", "min", "max", "std"]
+
+
+def synthetic_heart_rate(rows: int, sources: int, days: int) -> pd.DataFrame:
+    "Heart rate samples of several sources at random times over days"
+    rng = np.random.default_rng(0)
+    start = pd.Timestamp("2021-01-01 00:00:00").value
+    epoch = np.sort(start + rng.integers(0, days * 86400, rows) * 10**9)
+    dates = pd.to_datetime(epoch).tz_localize("UTC").tz_convert("-04:00")
+    return pd.DataFrame(
+        {
+            "type": "HKQuantityTypeIdentifierHeartRate",
+            "sourceName": rng.choice([f"Watch {i}" for i in range(sources)], rows),
+            "unit": "count/min",
+            "creationDate": dates,
+            "startDate": dates,
+            "endDate": dates,
+            "value": rng.normal(70, 12, rows).round(),
+        }
+    )
+
+
+def run(wrangled_data: DataWrangler, engine: str, **kwargs) -> (float, pd.DataFrame):
+    summary = TypeSummary(wrangled_data=wrangled_data, engine=engine, **kwargs)
+    start = time.perf_counter()
+    result = summary.summarize()
+    return time.perf_counter() - start, result
+
+
+def run_sweep(
+    wrangled_data: DataWrangler, intervals: List[str], engine: Optional[str], **kwargs
+) -> (float, List[pd.DataFrame]):
+    "Summaries of every interval, rolled up by summarize_sweep if engine is None"
+    start = time.perf_counter()
+    summaries = [
+        TypeSummary(
+            wrangled_data=wrangled_data, interval=interval, engine=engine or "auto", **kwargs
+        )
+        for interval in intervals
+    ]
+    if engine is None:
+        summarize_sweep(summaries)
+    results = [summary.summarize() for summary in summaries]
+    return time.perf_counter() - start, results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--sources", type=int, default=3)
+    parser.add_argument("--days", type=int, default=365)
+    parser.add_argument(
+        "--intervals", type=str, nargs="+", default=["1H", "6H", "1D", "1W", "1M", "1Y"]
+    )
+    parser.add_argument("--agg-sources", type=str, nargs="+", default=["mean", "sum"])
+    args = parser.parse_args()
+
+    wrangled_data = DataWrangler(
+        parsed_data=synthetic_heart_rate(args.rows, args.sources, args.days)
+    )
+    wrangled_data.preprocess()
+
+    print(f"{args.rows} rows, {args.sources} sources, {args.days} days")
+    print(
+        f"{'interval':>8} {'agg':>6} {'pandas':>10} {'numpy':>10} "
+        f"{'speedup':>8} {'identical':>10}"
+    )
+    for interval in args.intervals:
+        for agg_sources in args.agg_sources:
+            kwargs = dict(
+                interval=interval,
+                agg_sources=agg_sources,
+                measures=MEASURES,
+                ffill=agg_sources == "mean",
+            )
+            pandas_time, expected = run(wrangled_data, "pandas", **kwargs)
+            numpy_time, result = run(wrangled_data, "numpy", **kwargs)
+            try:
+                pd.testing.assert_frame_equal(result, expected, rtol=1e-9)
+                identical = True
+            except AssertionError:
+                identical = False
+            print(
+                f"{interval:>8} {agg_sources:>6} {pandas_time:>10.3f} "
+                f"{numpy_time:>10.3f} {pandas_time / numpy_time:>8.1f} "
+                f"{str(identical):>10}"
+            )
+
+    print(f"\nsweep of {' '.join(args.intervals)}")
+    print(
+        f"{'agg':>6} {'pandas':>10} {'numpy':>10} {'rollup':>10} "
+        f"{'speedup':>8} {'identical':>10}"
+    )
+    for agg_sources in args.agg_sources:
+        kwargs = dict(
+            agg_sources=agg_sources, measures=MEASURES, ffill=agg_sources == "mean"
+        )
+        pandas_time, expected = run_sweep(wrangled_data, args.intervals, "pandas", **kwargs)
+        numpy_time, _ = run_sweep(wrangled_data, args.intervals, "numpy", **kwargs)
+        rollup_time, results = run_sweep(wrangled_data, args.intervals, None, **kwargs)
+        try:
+            for result, frame in zip(results, expected):
+                pd.testing.assert_frame_equal(result, frame, rtol=1e-9)
+            identical = True
+        except AssertionError:
+            identical = False
+        print(
+            f"{agg_sources:>6} {pandas_time:>10.3f} {numpy_time:>10.3f} "
+            f"{rollup_time:>10.3f} {pandas_time / rollup_time:>8.1f} "
+            f"{str(identical):>10}"
+        )
@@ -0,0 +1,67 @@
+"""
+write_json size and time per codec and level, on a wrangled payload.
+
+Reads a wrangled JSON file (as written by wrangle_parsed_data) if given,
+otherwise wrangles synthetic heart-rate data.
+
+    python -m benchmarks.bench_write_json --wrangled data/wrangled/heart-rate.json
+    python -m benchmarks.bench_write_json --rows 500000 --threads 0 -1
+"""
+import argparse
+import tempfile
+import time
+
+from pathlib import Path
+
+from apple_health_data.core.summarizer import DataWrangler
+from apple_health_data.file_operations import read_json, write_json
+from benchmarks.bench_summarize import synthetic_heart_rate
+
+LEVELS = {
+    None: [None],
+    "zstd": [1, 3, 9, 19],
+    "snappy": [None],
+    "gzip": [1, 6, 9],
+    "lzo": [1, 9],
+}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--wrangled", type=Path, default=None)
+    parser.add_argument("--rows", type=int, default=200_000)
+    parser.add_argument("--threads", type=int, nargs="+", default=[0, -1])
+    args = parser.parse_args()
+
+    if args.wrangled is not None:
+        data = read_json(args.wrangled)
+    else:
+        wrangled_data = DataWrangler(parsed_data=synthetic_heart_rate(args.rows, 3, 365))
+        data = wrangled_data.model_dump(exclude={"vlogger_config"})
+
+    results = []
+    with tempfile.TemporaryDirectory() as tmp:
+        for codec, levels in LEVELS.items():
+            for level in levels:
+                for threads in args.threads if codec == "zstd" else [0]:
+                    start = time.perf_counter()
+                    file_path = write_json(
+                        data,
+                        Path(tmp) / "wrangled",
+                        compression_codec=codec,
+                        compression_level=level,
+                        compression_threads=threads,
+                    )
+                    elapsed = time.perf_counter() - start
+                    size = file_path.stat().st_size
+                    file_path.unlink()
+                    results.append((codec or "none", level, threads, size, elapsed))
+
+    print(f"{'codec':<8} {'level':>6} {'threads':>8} {'MB':>9} {'seconds':>8} {'MB/s':>8}")
+    raw_size = results[0][3]
+    for codec, level, threads, size, elapsed in results:
+        level = "-" if level is None else level
+        print(
+            f"{codec:<8} {level:>6} {threads:>8} {size / 2**20:>9.1f} "
+            f"{elapsed:>8.2f} {raw_size / 2**20 / elapsed:>8.1f}"
+        )
@@ -0,0 +1,98 @@
+"""
+Rows/sec of the pooled, buffered CSV writers against one open handle per type.
+
+    python -m benchmarks.bench_writer_pool --rows 2000000 --types 300
+"""
+import argparse
+import os
+import random
+import tempfile
+import time
+
+from pathlib import Path
+
+from apple_health_data.core.parser import BufferedWriter, HandlePool, RECORD_FIELDS
+
+ROW = (
+    '"Apple Watch","9.5","<<HKDevice: 0x283e1c0f0>, name:Apple Watch>","{kind}",'
+    '"count/min",2023-05-01 08:00:30 -0400,2023-05-01 08:00:00 -0400,'
+    "2023-05-01 08:00:30 -0400,{value}\n"
+)
+
+
+def make_rows(n_rows: int, n_types: int, seed: int = 0):
+    rng = random.Random(seed)
+    kinds = [f"Type{i}" for i in range(n_types)]
+    # Skewed like real exports: a few types hold most of the records
+    weights = [1.0 / (i + 1) for i in range(n_types)]
+    return [
+        (kind, ROW.format(kind=kind, value=rng.randint(40, 160)))
+        for kind in rng.choices(kinds, weights=weights, k=n_rows)
+    ]
+
+
+def write_direct(rows, directory: Path) -> float:
+    "One unpooled handle per type, one write per row (the previous behaviour)"
+    start = time.perf_counter()
+    handles = {}
+    for kind, line in rows:
+        f = handles.get(kind)
+        if f is None:
+            f = handles[kind] = open(directory / f"{kind}.csv", "w")
+            f.write(",".join(RECORD_FIELDS) + "\n")
+        f.write(line)
+    for f in handles.values():
+        f.close()
+    return time.perf_counter() - start
+
+
+def write_pooled(rows, directory: Path, max_open: int, buffer_size: int) -> float:
+    start = time.perf_counter()
+    pool = HandlePool(max_open)
+    writers = {}
+    for kind, line in rows:
+        f = writers.get(kind)
+        if f is None:
+            f = writers[kind] = BufferedWriter(pool, directory / f"{kind}.csv", buffer_size)
+            f.write(",".join(RECORD_FIELDS) + "\n")
+        f.write(line)
+    for f in writers.values():
+        f.close()
+    pool.close()
+    return time.perf_counter() - start
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--rows", type=int, default=1000000)
+    parser.add_argument("--types", type=int, default=300)
+    parser.add_argument("--max-open", type=int, nargs="+", default=[8, 64])
+    parser.add_argument("--buffer-size", type=int, nargs="+", default=[1 << 16, 1 << 18])
+    args = parser.parse_args()
+
+    rows = make_rows(args.rows, args.types)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        tmp = Path(tmp)
+        results = []
+
+        target = tmp / "direct"
+        target.mkdir()
+        results.append((f"direct ({args.types} handles)", write_direct(rows, target)))
+
+        for max_open in args.max_open:
+            for buffer_size in args.buffer_size:
+                target = tmp / f"pool-{max_open}-{buffer_size}"
+                target.mkdir()
+                elapsed = write_pooled(rows, target, max_open, buffer_size)
+                for name in os.listdir(tmp / "direct"):
+                    if (tmp / "direct" / name).read_bytes() != (target / name).read_bytes():
+                        raise AssertionError(f"{target / name} differs")
+                results.append(
+                    (f"pool max_open={max_open} buffer={buffer_size >> 10}K", elapsed)
+                )
+
+    print(f"{args.rows} rows over {args.types} types")
+    print(f"{'writer':<36} {'seconds':>8} {'rows/sec':>12}")
+    for name, elapsed in results:
+        print(f"{name:<36} {elapsed:>8.2f} {args.rows / elapsed:>12,.0f}")
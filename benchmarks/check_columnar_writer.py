@@ -0,0 +1,104 @@
+"""
+Check that ColumnarWriter keeps a value column that turns out not to be
+numeric as strings, serially and when merging parts.
+
+Writes numeric values followed by a string value in small row groups,
+merges a numeric part with a string part as a parallel parse does, and
+appends string parts to a writer that already wrote numeric row groups.
+Reads each file back and exits with an error if a value was lost.
+
+    python -m benchmarks.check_columnar_writer
+"""
+import argparse
+import tempfile
+
+from pathlib import Path
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from apple_health_data.core.parser import ColumnarWriter, RECORD_FIELDS
+
+DATE = "2023-05-01 08:00:30 -0400"
+CATEGORY = "HKCategoryValueSleepAnalysisAsleepCore"
+
+
+def record(value):
+    return {
+        "sourceName": "Apple Watch",
+        "type": "HKCategoryTypeIdentifierSleepAnalysis",
+        "creationDate": DATE,
+        "startDate": DATE,
+        "endDate": DATE,
+        "value": value,
+    }
+
+
+def write(path: Path, values, batch_size: int) -> Path:
+    writer = ColumnarWriter(str(path), RECORD_FIELDS, batch_size=batch_size)
+    for value in values:
+        writer.append(record(value))
+    writer.close()
+    return path
+
+
+def read_values(path: Path):
+    column = pq.read_table(path, columns=["value"]).column("value")
+    if column.type != pa.string():
+        raise AssertionError(f"{path.name}: value stored as {column.type}")
+    return column.to_pylist()
+
+
+def check(name: str, values, expected) -> bool:
+    "Numbers may come back reformatted, but none of them may be null"
+    same = (
+        None not in values
+        and len(values) == len(expected)
+        and all(
+            value == want if want == CATEGORY else float(value) == float(want)
+            for value, want in zip(values, expected)
+        )
+    )
+    print(f"{name:<24} {len(values)} values, identical={same}")
+    return same
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--batch-size", type=int, default=2)
+    args = parser.parse_args()
+
+    numbers = ["72", "73.5", "74", "75"]
+    failed = False
+    with tempfile.TemporaryDirectory() as tmp:
+        tmp = Path(tmp)
+
+        path = write(tmp / "serial.parquet", numbers + [CATEGORY], args.batch_size)
+        failed |= not check("serial", read_values(path), numbers + [CATEGORY])
+
+        parts = [
+            write(tmp / "numeric.part.parquet", numbers, args.batch_size),
+            write(tmp / "string.part.parquet", [CATEGORY], args.batch_size),
+        ]
+        merged = ColumnarWriter(str(tmp / "merged.parquet"), RECORD_FIELDS)
+        merged.write_parts(parts)
+        merged.close()
+        failed |= not check(
+            "merged parts", read_values(tmp / "merged.parquet"), numbers + [CATEGORY]
+        )
+
+        appended = ColumnarWriter(
+            str(tmp / "appended.parquet"), RECORD_FIELDS, batch_size=args.batch_size
+        )
+        for value in numbers:
+            appended.append(record(value))
+        appended.write_parts(parts[1:])
+        appended.close()
+        failed |= not check(
+            "parts after numbers",
+            read_values(tmp / "appended.parquet"),
+            numbers + [CATEGORY],
+        )
+
+    if failed:
+        raise SystemExit("ColumnarWriter lost values when widening to strings")
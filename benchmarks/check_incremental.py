@@ -0,0 +1,83 @@
+"""
+Check that an incremental parse of two cumulative exports gives the same
+files as a full parse of the second one.
+
+Writes an export and a longer export that extends it (the last day's
+ActivitySummary of the first is partial, the second completes it), parses
+the first and then the second into one folder with incremental set, and
+compares every file with a full parse of the second, for each output
+format. Exits with an error if they differ.
+
+    python -m benchmarks.check_incremental --records 20000 40000
+"""
+import argparse
+import os
+import tempfile
+
+from pathlib import Path
+
+import pyarrow.parquet as pq
+
+from apple_health_data.config_processor import parse_export_xml_parameters
+from apple_health_data.core.logger import VerbosityLogger
+from benchmarks.synthetic_export import write_synthetic_export
+
+VLOGGER = VerbosityLogger(logger_name="check-incremental")
+
+
+def read_output(path: Path):
+    "Rows of a parsed file, independent of its row groups and dictionaries"
+    if path.suffix == ".parquet":
+        return pq.read_table(path).to_pydict()
+    return path.read_text()
+
+
+def parse(export_xml: Path, target_directory: Path, output_format: str, incremental: bool):
+    parse_export_xml_parameters(
+        export_xml=export_xml,
+        target_directory=target_directory,
+        vlogger=VLOGGER,
+        output_format=output_format,
+        incremental=incremental,
+    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--records", type=int, nargs=2, default=[20_000, 40_000])
+    parser.add_argument(
+        "--output-formats", type=str, nargs="+", default=["csv", "parquet"]
+    )
+    args = parser.parse_args()
+
+    failed = False
+    with tempfile.TemporaryDirectory() as tmp:
+        tmp = Path(tmp)
+        first, second = (
+            write_synthetic_export(tmp / f"export-{n}.xml", n) for n in args.records
+        )
+
+        for output_format in args.output_formats:
+            full = tmp / f"full-{output_format}"
+            parse(second, full, output_format, incremental=False)
+            incremental = tmp / f"incremental-{output_format}"
+            parse(first, incremental, output_format, incremental=True)
+            parse(second, incremental, output_format, incremental=True)
+
+            names = sorted(
+                name for name in os.listdir(full) if name.endswith(output_format)
+            )
+            same = names == sorted(
+                name for name in os.listdir(incremental) if name.endswith(output_format)
+            )
+            for name in names:
+                if not (incremental / name).exists():
+                    continue
+                if read_output(full / name) != read_output(incremental / name):
+                    print(f"{output_format} {name} differs")
+                    same = False
+            print(f"{output_format:<8} {len(names)} files, identical={same}")
+            failed = failed or not same
+
+    if failed:
+        raise SystemExit("Incremental parse differs from a full parse")
@@ -0,0 +1,131 @@
+"""
+End-to-end check that the pipeline gives the same collated summaries with
+one job and with a process pool, for each artifact format.
+
+Parses a synthetic export, then wrangles, summarizes and collates the
+config.json parameters whose types it contains, once per job count, and
+compares the collated tables. Exits with an error if they differ.
+
+    python -m benchmarks.check_pipeline_jobs --records 50000 --jobs 1 2
+"""
+import argparse
+import tempfile
+
+from pathlib import Path
+
+import pandas as pd
+
+from apple_health_data.config_processor import (
+    collate_summaries,
+    get_parameter_types,
+    parse_export_xml_parameters,
+    summarize_parameters,
+    wrangle_parsed_data,
+)
+from apple_health_data.core.logger import VerbosityLogger
+from apple_health_data.file_operations import read_json
+from benchmarks.synthetic_export import write_synthetic_export
+
+CONFIG_JSON = Path(__file__).parent.parent / "apple_health_data" / "config.json"
+STEMS = ["heart-rate", "step-count", "active-energy-burned", "distance-walking-running"]
+
+# The pipeline's loggers are rebuilt in worker processes by name
+VLOGGER = VerbosityLogger(logger_name="check-pipeline-jobs")
+
+
+def run_pipeline(
+    parsed_folder: Path, output_folder: Path, parameters, jobs: int, artifact_format: str
+):
+    "Collated summaries of parameters from parsed_folder"
+    wrangler_kwargs = []
+    for param in parameters:
+        kwargs = dict(param["data_wrangler"])
+        kwargs["file_path"] = parsed_folder / Path(kwargs["file_path"]).name
+        wrangler_kwargs.append(kwargs)
+
+    wrangled_folder = output_folder / "wrangled"
+    summarized_folder = output_folder / "summarized"
+    wrangled_folder.mkdir(parents=True)
+    summarized_folder.mkdir(parents=True)
+
+    wrangled_filemap = wrangle_parsed_data(
+        wrangler_kwargs=wrangler_kwargs,
+        wrangled_folder=wrangled_folder,
+        vlogger=VLOGGER,
+        jobs=jobs,
+        artifact_format=artifact_format,
+    )
+    summaries_filemap = summarize_parameters(
+        wrangled_filemap=wrangled_filemap,
+        parameters=parameters,
+        summarized_folder=summarized_folder,
+        vlogger=VLOGGER,
+        jobs=jobs,
+        artifact_format=artifact_format,
+    )
+    return collate_summaries(type_summaries=summaries_filemap, vlogger=VLOGGER)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--records", type=int, default=20_000)
+    parser.add_argument("--jobs", type=int, nargs="+", default=[1, 2])
+    parser.add_argument(
+        "--artifact-formats", type=str, nargs="+", default=["json", "parquet", "series"]
+    )
+    args = parser.parse_args()
+
+    config = read_json(CONFIG_JSON)
+    parameters = [
+        param
+        for param in config["parameters"]
+        if Path(param["data_wrangler"]["file_path"]).stem in STEMS
+    ]
+
+    with tempfile.TemporaryDirectory() as tmp:
+        tmp = Path(tmp)
+        export_zip = write_synthetic_export(
+            tmp / "export.xml", args.records, zip_export=True
+        )
+        parsed_folder = tmp / "parsed"
+        parse_export_xml_parameters(
+            export_xml=export_zip,
+            target_directory=parsed_folder,
+            vlogger=VLOGGER,
+            types=get_parameter_types(parameters),
+        )
+
+        failed = False
+        for artifact_format in args.artifact_formats:
+            expected = None
+            for jobs in args.jobs:
+                tables = run_pipeline(
+                    parsed_folder,
+                    tmp / f"{artifact_format}-{jobs}",
+                    parameters,
+                    jobs,
+                    artifact_format,
+                )
+                if not tables:
+                    raise AssertionError(f"No summaries collated with {jobs} jobs")
+                if expected is None:
+                    expected = tables
+                    continue
+                same = tables.keys() == expected.keys()
+                for key in expected.keys() & tables.keys():
+                    try:
+                        pd.testing.assert_frame_equal(
+                            tables[key].reset_index(drop=True),
+                            expected[key].reset_index(drop=True),
+                        )
+                    except AssertionError as e:
+                        print(f"{artifact_format} {key}: {e}")
+                        same = False
+                print(
+                    f"{artifact_format:<8} jobs={jobs} vs jobs={args.jobs[0]}: "
+                    f"{len(tables)} tables, identical={same}"
+                )
+                failed = failed or not same
+
+    if failed:
+        raise SystemExit("Collated summaries differ between job counts")
@@ -0,0 +1,185 @@
+"""
+Synthetic Apple Health exports for the benchmarks
+"""
+import random
+import datetime
+import zipfile
+
+from pathlib import Path
+
+TYPES = [
+    "HKQuantityTypeIdentifierHeartRate",
+    "HKQuantityTypeIdentifierStepCount",
+    "HKQuantityTypeIdentifierActiveEnergyBurned",
+    "HKQuantityTypeIdentifierDistanceWalkingRunning",
+    "HKQuantityTypeIdentifierHeartRateVariabilitySDNN",
+    "HKCategoryTypeIdentifierSleepAnalysis",
+]
+
+SOURCES = ["Apple Watch", "iPhone", "Health Mate"]
+
+DEVICE = (
+    "&lt;&lt;HKDevice: 0x283e1c0f0&gt;, name:Apple Watch, manufacturer:Apple Inc., "
+    "model:Watch, hardware:Watch6,2, software:9.5&gt;"
+)
+
+
+def format_date(date: datetime.datetime, offset: str) -> str:
+    return date.strftime("%Y-%m-%d %H:%M:%S") + " " + offset
+
+
+def write_synthetic_export(
+    file_path: Path, n_records: int, seed: int = 0, zip_export: bool = False
+) -> Path:
+    """
+    Write an export.xml with n_records Records spread over the types above,
+    with the occasional nested metadata, Correlation and Workout, and an
+    ActivitySummary per day, laid out like the Health app's own export.
+    Exports of more records with the same seed extend those of fewer, like
+    cumulative exports: the last day's summary counts the records of that
+    day so far, so it is completed by the longer export.
+    """
+    rng = random.Random(seed)
+    file_path = Path(file_path)
+    start = datetime.datetime(2022, 1, 1)
+    day_records = {}
+
+    with open(file_path, "w") as f:
+        f.write('<?xml version="1.0" encoding="UTF-8"?>\n')
+        f.write("<!DOCTYPE HealthData [\n<!ELEMENT HealthData (ExportDate,Me,(Record|Correlation|Workout|ActivitySummary)*)>\n]>\n")
+        f.write('<HealthData locale="en_US">\n')
+        f.write(' <ExportDate value="2023-06-01 10:00:00 -0400"/>\n')
+        f.write(' <Me HKCharacteristicTypeIdentifierDateOfBirth="1982-03-13"/>\n')
+
+        for i in range(n_records):
+            date = start + datetime.timedelta(seconds=37 * i)
+            offset = "-0400" if 3 < date.month < 11 else "-0500"
+            begin = format_date(date, offset)
+            finish = format_date(date + datetime.timedelta(seconds=30), offset)
+            day_records[date.date()] = day_records.get(date.date(), 0) + 1
+            attributes = (
+                f'type="{rng.choice(TYPES)}" sourceName="{rng.choice(SOURCES)}" '
+                f'sourceVersion="9.5" device="{DEVICE}" unit="count/min" '
+                f'creationDate="{finish}" startDate="{begin}" endDate="{finish}" '
+                f'value="{rng.uniform(40, 160):.3f}"'
+            )
+            if i % 20 == 0:
+                f.write(f" <Record {attributes}>\n")
+                f.write('  <MetadataEntry key="HKMetadataKeyHeartRateMotionContext" value="1"/>\n')
+                f.write(" </Record>\n")
+            else:
+                f.write(f" <Record {attributes}/>\n")
+
+            if i % 500 == 0:
+                f.write(
+                    f' <Correlation type="HKCorrelationTypeIdentifierBloodPressure" '
+                    f'sourceName="iPhone" creationDate="{begin}" startDate="{begin}" endDate="{begin}">\n'
+                )
+                f.write(
+                    f'  <Record type="HKQuantityTypeIdentifierBloodPressureSystolic" '
+                    f'sourceName="iPhone" unit="mmHg" creationDate="{begin}" '
+                    f'startDate="{begin}" endDate="{begin}" value="120"/>\n'
+                )
+                f.write(" </Correlation>\n")
+
+            if i % 1000 == 0:
+                f.write(
+                    f' <Workout workoutActivityType="HKWorkoutActivityTypeWalking" '
+                    f'duration="30" durationUnit="min" sourceName="Apple Watch" '
+                    f'sourceVersion="9.5" creationDate="{finish}" startDate="{begin}" endDate="{finish}">\n'
+                )
+                f.write(f'  <WorkoutEvent type="HKWorkoutEventTypeSegment" date="{begin}"/>\n')
+                f.write(" </Workout>\n")
+
+        for day, count in day_records.items():
+            f.write(
+                f' <ActivitySummary dateComponents="{day}" activeEnergyBurned="{count}" '
+                f'activeEnergyBurnedGoal="600" activeEnergyBurnedUnit="Cal" '
+                f'appleExerciseTime="30" appleExerciseTimeGoal="30" '
+                f'appleStandHours="10" appleStandHoursGoal="12"/>\n'
+            )
+
+        f.write("</HealthData>\n")
+
+    if zip_export:
+        zip_path = file_path.with_suffix(".zip")
+        with zipfile.ZipFile(zip_path, "w", zipfile.ZIP_DEFLATED) as zip_file:
+            zip_file.write(file_path, "apple_health_export/export.xml")
+        return zip_path
+
+    return file_path
+
+
+def write_synthetic_routes(
+    zip_path: Path, n_routes: int, n_points: int, seed: int = 0
+) -> Path:
+    """
+    Add n_routes workout-routes/*.gpx members of n_points trackpoints each
+    to the export.zip at zip_path (created if missing), in the Health
+    app's GPX layout.
+    """
+    rng = random.Random(seed)
+    start = datetime.datetime(2022, 1, 1, 7)
+
+    with zipfile.ZipFile(zip_path, "a", zipfile.ZIP_DEFLATED) as zip_file:
+        for i in range(n_routes):
+            date = start + datetime.timedelta(days=i)
+            lat, lon = 37.33 + rng.uniform(-0.1, 0.1), -122.03 + rng.uniform(-0.1, 0.1)
+            points = []
+            for j in range(n_points):
+                lat += rng.uniform(-1e-4, 1e-4)
+                lon += rng.uniform(-1e-4, 1e-4)
+                time = (date + datetime.timedelta(seconds=j)).strftime("%Y-%m-%dT%H:%M:%SZ")
+                points.append(
+                    f'<trkpt lon="{lon:.6f}" lat="{lat:.6f}"><ele>{rng.uniform(10, 20):.6f}</ele>'
+                    f"<time>{time}</time><extensions><speed>{rng.uniform(1, 3):.6f}</speed>"
+                    f"<course>-1.0</course><hAcc>2.6</hAcc><vAcc>1.9</vAcc></extensions></trkpt>\n"
+                )
+            gpx = (
+                '<?xml version="1.0" encoding="UTF-8"?>\n'
+                '<gpx version="1.1" creator="Apple Health Export" xmlns="http://www.topografix.com/GPX/1/1">\n'
+                f"<metadata><time>{date:%Y-%m-%dT%H:%M:%SZ}</time></metadata>\n"
+                f"<trk><name>Route {date:%Y-%m-%d %I:%M%p}</name><trkseg>\n"
+                + "".join(points)
+                + "</trkseg></trk>\n</gpx>\n"
+            )
+            zip_file.writestr(
+                f"apple_health_export/workout-routes/route_{date:%Y-%m-%d_%I.%M%p}.gpx", gpx
+            )
+
+    return Path(zip_path)
+
+
+def write_synthetic_ecgs(
+    zip_path: Path, n_recordings: int, n_samples: int = 15360, seed: int = 0
+) -> Path:
+    """
+    Add n_recordings electrocardiograms/*.csv members of n_samples
+    voltages each (30 s at 512 Hz by default) to the export.zip at
+    zip_path (created if missing), in the Health app's CSV layout: the
+    header, then the Lead and Unit block, then the samples, separated by
+    blank lines.
+    """
+    rng = random.Random(seed)
+    start = datetime.datetime(2022, 1, 1, 8)
+
+    with zipfile.ZipFile(zip_path, "a", zipfile.ZIP_DEFLATED) as zip_file:
+        for i in range(n_recordings):
+            date = start + datetime.timedelta(days=i, minutes=rng.randint(0, 600))
+            offset = "-0400" if 3 < date.month < 11 else "-0500"
+            header = (
+                'Name,Jane Doe\nDate of Birth,"Mar 13, 1982"\n'
+                f"Recorded Date,{format_date(date, offset)}\n"
+                "Classification,Sinus Rhythm\nSymptoms,\nSoftware Version,2\n"
+                'Device,"Watch6,2"\nSample Rate,512 hertz\n\n'
+                "Lead,Lead I\nUnit,µV\n\n"
+            )
+            samples = "\n".join(
+                f"{rng.gauss(0, 150):.3f}" for _ in range(n_samples)
+            )
+            zip_file.writestr(
+                f"apple_health_export/electrocardiograms/ecg_{date:%Y-%m-%d_%H-%M}.csv",
+                header + samples + "\n",
+            )
+
+    return Path(zip_path)
@@ -7,14 +7,17 @@ from apple_health_data.config_processor import (
     create_folder_tree,
     process_biodata,
     move_or_copy_export_zip,
-    extract_export_xml,
+    get_parameter_types,
     parse_export_xml_parameters,
+    parse_workout_routes,
+    parse_electrocardiograms,
     wrangle_parsed_data,
     summarize_parameters,
     collate_summaries,
     export_collated_summaries
 )
 
+from apple_health_data.core.cache import SummaryCache
 from apple_health_data.core.logger import VerbosityLogger
 from apple_health_data.file_operations import write_json, read_json
 from apple_health_data.utils import save_dataframe
@@ -46,12 +49,86 @@ if __name__ == "__main__":
     parser.add_argument(
         "--move", default=False, help="Move export.zip file instead of copying"
     )
+    parser.add_argument(
+        "--parse-all-types",
+        action="store_true",
+        help="Parse every record type in export.xml, not just the configured parameters",
+    )
     parser.add_argument(
         "--verbose",
         action="store_true",
         help="Displays log messages on screen even if logging is disabled",
     )
 
+    parser.add_argument(
+        "--parsed-format",
+        type=str,
+        choices=["csv", "parquet"],
+        default="csv",
+        help="File format for the parsed record types (csv or parquet). Default is csv.",
+    )
+
+    parser.add_argument(
+        "--incremental-folder",
+        type=str,
+        default=None,
+        help="Keep parsed data in this folder across exports and only append records newer than its watermarks",
+    )
+
+    parser.add_argument(
+        "--nested-tables",
+        action="store_true",
+        help="Also extract MetadataEntry and heartbeat elements into their own Parquet tables",
+    )
+
+    parser.add_argument(
+        "--workout-routes",
+        action="store_true",
+        help="Also parse the workout routes (GPX files) in export.zip",
+    )
+
+    parser.add_argument(
+        "--electrocardiograms",
+        action="store_true",
+        help="Also parse the ECG recordings (CSV files) in export.zip",
+    )
+
+    parser.add_argument(
+        "--parse-workers",
+        type=int,
+        default=1,
+        help="Number of processes parsing export.xml in parallel byte ranges. Default is 1.",
+    )
+
+    parser.add_argument(
+        "--jobs",
+        type=int,
+        default=1,
+        help="Number of processes wrangling and summarizing parameters in parallel. Default is 1.",
+    )
+
+    parser.add_argument(
+        "--summary-cache",
+        type=str,
+        default=None,
+        help="Keep summaries in this folder across runs and reuse them when the wrangled data and settings are unchanged",
+    )
+
+    parser.add_argument(
+        "--summary-cache-size",
+        type=int,
+        default=1024,
+        help="Size in MB beyond which the least recently used summaries are evicted from --summary-cache. Default is 1024.",
+    )
+
+    parser.add_argument(
+        "--artifact-format",
+        type=str,
+        choices=["json", "parquet", "series"],
+        default="json",
+        help="File format for the wrangled and summarized data (json, or parquet or memory-mapped series stores with a JSON metadata file). Default is json.",
+    )
+
     parser.add_argument(
         "--compression",
         type=str,
@@ -60,7 +137,24 @@ if __name__ == "__main__":
         help="Compression codec for JSON data (zstd, snappy, gzip, or lzo). Default is no compression.",
     )
 
+    parser.add_argument(
+        "--compression-level",
+        type=int,
+        default=None,
+        help="Level of the --compression codec (zstd 1-22, gzip 1-9, lzo 1 or 9; snappy has none). Default is the codec's default.",
+    )
+
     args = parser.parse_args()
+    if args.nested_tables and args.incremental_folder is not None:
+        parser.error("--nested-tables cannot be combined with --incremental-folder")
+    if args.jobs < 1:
+        parser.error("--jobs must be at least 1")
+    if args.parse_workers < 1:
+        parser.error("--parse-workers must be at least 1")
+    if args.compression_level is not None and args.compression in (None, "snappy"):
+        parser.error("--compression-level needs --compression zstd, gzip or lzo")
+    if args.compression == "lzo" and args.compression_level not in (None, 1, 9):
+        parser.error("--compression-level must be 1 or 9 for lzo")
 
     export_zip = Path(args.export_zip) or Path("export.zip")
 
@@ -103,21 +197,48 @@ if __name__ == "__main__":
         vlogger.info("Copying export.zip to data/raw folder", 0)
         move_or_copy_export_zip(export_zip, folders["raw"], move=args.move)
 
-        vlogger.info("Extracting export.xml from export.zip", 0)
-        export_zip_path = Path(folders["raw"]).joinpath(Path(export_zip).name)
-        export_xml = extract_export_xml(
-            export_zip_path, folders["raw"], vlogger=vlogger
-        )
+        parsed_folder = folders["parsed"]
+        if args.incremental_folder is not None:
+            parsed_folder = Path(args.incremental_folder)
+            parsed_folder.mkdir(parents=True, exist_ok=True)
 
+        export_zip_path = Path(folders["raw"]).joinpath(Path(export_zip).name)
         parse_export_xml_parameters(
-            export_xml=export_xml, target_directory=folders["parsed"], vlogger=vlogger
+            export_xml=export_zip_path,
+            target_directory=parsed_folder,
+            vlogger=vlogger,
+            types=(
+                None
+                if args.parse_all_types
+                else get_parameter_types(config["parameters"])
+            ),
+            workers=args.parse_workers,
+            output_format=args.parsed_format,
+            incremental=args.incremental_folder is not None,
+            nested=args.nested_tables,
         )
 
+        if args.workout_routes:
+            parse_workout_routes(
+                export_zip=export_zip_path,
+                target_directory=parsed_folder,
+                vlogger=vlogger,
+            )
+
+        if args.electrocardiograms:
+            parse_electrocardiograms(
+                export_zip=export_zip_path,
+                target_directory=parsed_folder,
+                vlogger=vlogger,
+            )
+
         wrangler_kwargs = []
         parameters = config["parameters"].copy()  # important to copy!
         for param in parameters:
             kwargs = param["data_wrangler"]
-            kwargs["file_path"] = folders["parsed"] / kwargs["file_path"]
+            kwargs["file_path"] = parsed_folder / Path(
+                kwargs["file_path"]
+            ).with_suffix(f".{args.parsed_format}")
             wrangler_kwargs.append(kwargs)
 
         wrangled_filemap = wrangle_parsed_data(
@@ -125,6 +246,9 @@ if __name__ == "__main__":
             wrangled_folder=folders["wrangled"],
             compression_codec=args.compression,
             vlogger=vlogger,
+            jobs=args.jobs,
+            artifact_format=args.artifact_format,
+            compression_level=args.compression_level,
         )
 
         wrangled_json = write_json(
@@ -146,6 +270,18 @@ if __name__ == "__main__":
             summarized_folder=folders["summarized"],
             compression_codec=args.compression,
             vlogger=vlogger,
+            jobs=args.jobs,
+            summary_cache=(
+                None
+                if args.summary_cache is None
+                else SummaryCache(
+                    args.summary_cache,
+                    max_bytes=args.summary_cache_size * 2**20,
+                    vlogger=vlogger,
+                )
+            ),
+            artifact_format=args.artifact_format,
+            compression_level=args.compression_level,
         )
 
         summaries_json = write_json(